@@ -1,2 +1,3 @@
-from .tools import get_host_kwargs
+from .tools import get_host_kwargs, get_pool_kwargs, TransactionManager
+from .backends import MySQLBackend, SQLiteBackend
 from .police_brutality import *
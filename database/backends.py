@@ -0,0 +1,77 @@
+from os.path import dirname, join
+from .tools import get_host_kwargs
+
+
+class MySQLBackend(object):
+	"""The MySQL server that the databases were written for. Anything that takes a backend uses this one when it is given None."""
+	placeholder = "%s"
+
+	def __init__(self, **kwargs):
+		"""
+		:param kwargs: The keyword arguments passed on to mysql.connector.connect. Defaults to get_host_kwargs().
+		"""
+		self.kwargs = kwargs
+
+	def __str__(self) -> str:
+		return f"MySQL server at {self.kwargs.get('host', 'the host from get_host_kwargs')}"
+
+	def connect(self):
+		from mysql.connector import connect
+		return connect(**(self.kwargs or get_host_kwargs()))
+
+	def cursor(self, db, buffered:bool=True):
+		return db.cursor(buffered=buffered)
+
+	def placeholders(self, number:int) -> str:
+		return ((self.placeholder + ",") * number).rstrip(",")
+
+	def upsert_statement(self, table_name:str, columns, key:str="id") -> str:
+		"""An INSERT that updates every other column when a row with the same key already exists"""
+		assignments = ','.join(f"{column} = VALUES({column})" for column in columns if column != key)
+		return f"INSERT INTO {table_name}({','.join(columns)}) VALUES({self.placeholders(len(columns))}) ON DUPLICATE KEY UPDATE {assignments}"
+
+
+class SQLiteBackend(MySQLBackend):
+	"""
+	A local SQLite copy of the databases. Every schema (police_brutality, sir) is its own file, attached under the schema's name, so the same fully qualified table names work on both backends.
+	"""
+	placeholder = "?"
+	CREATE_TABLE_SCRIPTS = {"police_brutality": join(dirname(__file__), "police_brutality", "create_table.sqlite.sql"),
+							"sir": join(dirname(__file__), "education", "create_table.sqlite.sql")}
+
+	def __init__(self, directory:str=".", schemas=("police_brutality", "sir")):
+		"""
+		:param str directory: The folder that holds one ``<schema>.sqlite3`` file per schema. Use ":memory:" for databases that are not saved.
+		:param tuple schemas: The schemas that are attached.
+		"""
+		super().__init__()
+		self.directory = directory
+		self.schemas = schemas
+
+	def __str__(self) -> str:
+		return f"SQLite databases {', '.join(self.schemas)} in {self.directory}"
+
+	def file(self, schema:str) -> str:
+		return ":memory:" if self.directory == ":memory:" else join(self.directory, f"{schema}.sqlite3")
+
+	def connect(self):
+		from sqlite3 import connect
+		db = connect(":memory:")
+		for schema in self.schemas:
+			db.execute("ATTACH DATABASE ? AS " + schema, (self.file(schema),))
+		db.execute("PRAGMA foreign_keys = ON")
+		return db
+
+	def cursor(self, db, buffered:bool=True):
+		return db.cursor()
+
+	def upsert_statement(self, table_name:str, columns, key:str="id") -> str:
+		assignments = ','.join(f"{column} = excluded.{column}" for column in columns if column != key)
+		return f"INSERT INTO {table_name}({','.join(columns)}) VALUES({self.placeholders(len(columns))}) ON CONFLICT({key}) DO UPDATE SET {assignments}"
+
+	def create_tables(self, db):
+		"""Creates any table that does not exist yet in the attached schemas"""
+		for schema in self.schemas:
+			with open(self.CREATE_TABLE_SCRIPTS[schema]) as file:
+				db.executescript(file.read())
+		db.commit()
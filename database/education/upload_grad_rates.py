@@ -1,36 +1,189 @@
-def upload_graduation_rates(cursor, state, graduation_rate):
-	cursor.execute(f"SELECT COUNT(graduation_rate) FROM sir_education.state_data WHERE state = '{state}'")
-	if cursor.fetchone()[0]:
-		cursor.execute(f"UPDATE sir_education.state_data SET graduation_rate = {graduation_rate} WHERE state = '{state}'")
-	else:
-		cursor.execute(f"INSERT INTO sir_education.state_data(state,graduation_rate) VALUES ({state},{graduation_rate})")
+from ..backends import MySQLBackend
+from ..tools import TransactionManager
 
 
-def upload_grad_rates(db, file:str, skip_headers=True):
+# Every column of sir.education and the type its values are converted to
+EDUCATION_COLUMNS = {"state": str, "abbreviation": str, "population_2018": int, "population_2020": int, "population_2021": int,
+					 "growth_2021": float, "census_2010": int, "growth_since_2010": int, "percent_of_us": float, "density": int,
+					 "graduation_rate": float, "instruction_spending_per_pupil": float, "support_spending_per_pupil": float,
+					 "total_spending_per_pupil": float, "total_instruction_spending": int, "total_spending": int,
+					 "total_support_spending": int, "black_population": int, "hispanic_population": int,
+					 "native_american_population": int, "asian_population": int, "pacific_islander_population": int,
+					 "white_population": int, "other_population": int, "african_american_percent": float,
+					 "percent_victims_black": int, "disparity": int, "black_people_killed": int, "hispanic_people_killed": int,
+					 "native_american_people_killed": int, "asian_people_killed": int, "pacific_islanders_killed": int,
+					 "white_people_killed": int, "unknown_race_killed": int, "black_death_rate": float, "hispanic_death_rate": float,
+					 "native_american_death_rate": float, "asian_death_rate": float, "pacific_islanders_death_rate": float,
+					 "white_death_rate": float, "all_people_rate": float, "disparity_in_rate": float,
+					 "black_white_disparity": float, "hispanic_white_disparity": float, "native_american_white_disparity": float}
+
+# Headers of the state files, after they are lower cased and their spaces are replaced, that are not named after their column
+HEADER_ALIASES = {"state_name": "state", "density_(p/mi²)": "density"}
+
+# The NOT NULL columns of sir.education that a file has to have. abbreviation is filled in from the state when it is missing.
+REQUIRED_COLUMNS = ("state",)
+
+# The states and territories that sir.education has rows for. It is the 50 states, DC, and Puerto Rico out of python_scripts' CountyPopulation.STATE_DICTIONARY.
+# It is copied here because importing python_scripts would also import pandas, requests, scipy, and the plotting modules just to load a csv.
+STATE_ABBREVIATIONS = {'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA', 'Colorado': 'CO', 'Connecticut': 'CT',
+					   'Delaware': 'DE', 'District of Columbia': 'DC', 'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL',
+					   'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS', 'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD',
+					   'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS', 'Missouri': 'MO', 'Montana': 'MT',
+					   'Nebraska': 'NE', 'Nevada': 'NV', 'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY',
+					   'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK', 'Oregon': 'OR', 'Pennsylvania': 'PA',
+					   'Puerto Rico': 'PR', 'Rhode Island': 'RI', 'South Carolina': 'SC', 'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX',
+					   'Utah': 'UT', 'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV', 'Wisconsin': 'WI', 'Wyoming': 'WY'}
+
+
+def upload_grad_rates(db, file:str, skip_headers=True, backend=None, transactions=None) -> TransactionManager:
 	from csv import reader
-	cursor = db.cursor(buffered=True)
+	cursor = db.cursor(buffered=True) if backend is None else backend.cursor(db)
+	transactions = TransactionManager(db, savepoints=True) if transactions is None else transactions
 	with open(file, 'r') as csvfile:
 		csv = reader(csvfile, delimiter=",", quotechar='"')
 		iterator = iter(csv)
 		if skip_headers:
 			next(iterator)
-		for row in iterator:
-			upload_graduation_rates(cursor, row[0], float(row[1]))
+		records = validate_state_data(iterator, ("state", "graduation_rate"))
+	with transactions.batch(len(records)):
+		upsert_state_data(cursor, records, backend)
+	return transactions.finish()
+
+
+def header_to_column(header:str) -> str|None:
+	"""The sir.education column that a state file's header holds, i.e. "Percent Of Us" is percent_of_us. None if the table does not have it."""
+	column = header.strip().lower().replace(" ", "_")
+	column = HEADER_ALIASES.get(column, column)
+	return column if column in EDUCATION_COLUMNS else None
+
+
+def match_headers(headers, ignore=()) -> list[str|None]:
+	"""
+	The sir.education column of each header of a state file
+	:param ignore: Headers that are expected not to be in the table. Their columns are None, and they are skipped.
+	:raises ValueError: If a header is not in the table or ``ignore``, two headers hold the same column, or a REQUIRED_COLUMNS column is missing, so a renamed or misspelled header fails instead of being dropped.
+	"""
+	ignore = {header.strip().lower() for header in ignore}
+	columns = []
+	errors = []
+	for header in headers:
+		column = header_to_column(header)
+		if column is None and header.strip().lower() not in ignore:
+			errors.append(f"{header.strip()!r} is not a column of sir.education")
+		elif column is not None and column in columns:
+			errors.append(f"{header.strip()!r} holds {column}, which an earlier header already holds")
+		columns.append(column)
+	errors.extend(f"The {column} column is missing" for column in REQUIRED_COLUMNS if column not in columns)
+	if errors:
+		raise ValueError("The headers do not match sir.education:\n" + "\n".join(errors))
+	return columns
 
 
-def upload_wpr_state_data(cursor, dct:dict):
-	cursor.execute(f"SELECT COUNT(state) FROM sir_education.state_data WHERE state = '{dct['state']}'")
-	if cursor.fetchone()[0]:
-		pass
-	else:
-		cursor.execute()
+def convert_education_value(value, column:str):
+	"""Converts a value from a state file to its column's type. Thousands separators, percent and dollar signs are removed, and empty values are None."""
+	if value is None:
+		return None
+	value = str(value).strip()
+	if value.lower() in ("", "nan", "none", "null"):
+		return None
+	column_type = EDUCATION_COLUMNS[column]
+	if column_type is str:
+		return value
+	value = float(value.replace(",", "").replace("%", "").replace("$", ""))
+	return int(round(value)) if column_type is int else value
+
+
+def validate_state_data(rows, columns) -> list[dict]:
+	"""
+	Converts every row of a state file to the types of sir.education, and fills in the state's abbreviation when the file does not have it
+	:param rows: An iterable of lists of the file's values, in the order of ``columns``.
+	:param columns: The column of each value, or None for a value that is not in the table.
+	:return: A dictionary for each row, holding the columns of the file that are in the table, plus abbreviation.
+	:raises ValueError: If the file does not have a state column, or any value cannot be converted. Every bad value is listed, so the file can be fixed in one pass.
+	"""
+	missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+	if missing:
+		raise ValueError(f"The state file does not have a {', '.join(missing)} column")
+	records = []
+	errors = []
+	for line, row in enumerate(rows, 2):
+		dct = {}
+		for column, value in zip(columns, row):
+			if column is None:
+				continue
+			try:
+				dct[column] = convert_education_value(value, column)
+			except ValueError:
+				errors.append(f"Line {line}, {column}: {value!r} is not a {EDUCATION_COLUMNS[column].__name__}")
+		if dct.get("state") is None:
+			errors.append(f"Line {line} does not have a state")
+			continue
+		if dct.get("abbreviation") is None:
+			if dct["state"] not in STATE_ABBREVIATIONS:
+				errors.append(f"Line {line}: {dct['state']} does not have an abbreviation")
+				continue
+			dct["abbreviation"] = STATE_ABBREVIATIONS[dct["state"]]
+		records.append(dct)
+	if errors:
+		raise ValueError("The state file does not match sir.education:\n" + "\n".join(errors))
+	return records
+
+
+def upsert_state_data(cursor, records:list[dict], backend=None, chunk_size:int=100) -> int:
+	"""
+	Inserts or updates every record in sir.education with one parameterized executemany per chunk. Columns that the records do not have are left as they are.
+	:param records: Dictionaries that all have the same columns, i.e. from validate_state_data.
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:return: The number of records that were written.
+	"""
+	if not records:
+		return 0
+	columns = tuple(records[0].keys())
+	command = (MySQLBackend() if backend is None else backend).upsert_statement("sir.education", columns, key="state")
+	for start in range(0, len(records), chunk_size):
+		cursor.executemany(command, [tuple(dct[column] for column in columns) for dct in records[start:start + chunk_size]])
+	return len(records)
+
+
+def upload_wpr_state_data(cursor, dct:dict, backend=None):
+	"""Inserts or updates one state's row of sir.education. The keys can be columns or state file headers."""
+	columns = match_headers(dct.keys())
+	upsert_state_data(cursor, validate_state_data([list(dct.values())], columns), backend)
+
+
+def upload_state_data(db, file:str, backend=None, transactions=None, chunk_size:int=100, ignore=()) -> TransactionManager:
+	"""
+	Refreshes every column of sir.education that a state file has, i.e. the state_data.csv written by python_scripts.population.states_to_csv, in one batch
+	:param str file: The csv file. The first line holds the headers, which are matched to the columns with match_headers.
+	:param ignore: Headers that are expected not to be in the table, and are skipped. Any other header that is not in the table is an error.
+	:param backend: The backend from database.backends that the connection belongs to. None is the MySQL server.
+	:param transactions: An optional TransactionManager. If the whole file cannot be written, none of it is.
+	:raises ValueError: If the file does not match the table. Nothing is written.
+	"""
+	from csv import reader
+	cursor = db.cursor(buffered=True) if backend is None else backend.cursor(db)
+	transactions = TransactionManager(db, savepoints=True) if transactions is None else transactions
+	with open(file, 'r', newline="") as csvfile:
+		csv = reader(csvfile, delimiter=",", quotechar='"', skipinitialspace=True)  # states_to_csv separates its values with ", "
+		columns = match_headers(next(csv), ignore)
+		records = validate_state_data(csv, columns)
+	with transactions.batch(len(records)):
+		upsert_state_data(cursor, records, backend, chunk_size)
+	return transactions.finish()
 
 
-def upload_education(db):
-	upload_grad_rates(db, r"D:\data\SIR\Education\wpr_graduation_rate.csv")
+def upload_education(db, backend=None):
+	transactions = upload_state_data(db, r"D:\data\SIR\Education\state_data.csv", backend=backend)
+	upload_grad_rates(db, r"D:\data\SIR\Education\wpr_graduation_rate.csv", backend=backend, transactions=transactions)
+	if transactions.errors:
+		print(transactions.report())
 
 
 if __name__ == "__main__":
-	from ..tools import get_host_kwargs
-	from mysql.connector import connect
-	upload_education(connect(**get_host_kwargs()))
+	from ..backends import SQLiteBackend
+	sqlite_directory = None  # Set to a folder, i.e. r"D:\data\SIR\sqlite", to load a local SQLite copy instead of the MySQL server
+	backend = MySQLBackend() if sqlite_directory is None else SQLiteBackend(sqlite_directory, schemas=("sir",))
+	db = backend.connect()
+	if sqlite_directory is not None:
+		backend.create_tables(db)
+	upload_education(db, backend=backend)
@@ -1,3 +1,8 @@
 from .tools import Gender, Race, ThreatLevel, Flee, get_true_value, correct_dictionary_types, \
-	generate_placeholders, convert_to_boolean, convert_to_custom_enum, convert_to_gender, convert_to_race, \
-	convert_to_threat_level, convert_to_flee, check_similarity
+	generate_placeholders, get_placeholder, convert_to_boolean, convert_to_custom_enum, convert_to_gender, convert_to_race, \
+	convert_to_threat_level, convert_to_flee, check_similarity, ChangePlan, write_plan, upsert_records, \
+	correct_dataframe_types, frame_to_records, is_complete, ENUM_ALIASES, register_enum_alias, convert_series_to_custom_enum, \
+	WAPO_TYPE_MAP, MPV_TYPE_MAP, MPV_COLUMNS, MPV_REQUIRED_COLUMNS, DATE_FORMATS, parse_date, parse_date_column, detect_date_format
+from .snapshot import TableSnapshot
+from .changelog import ChangeLog
+from .join import IncidentJoin
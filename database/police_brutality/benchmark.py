@@ -0,0 +1,287 @@
+from datetime import datetime as dt
+from json import dumps
+from numpy import flatnonzero, full
+from numpy.random import default_rng
+from os import makedirs
+from os.path import exists, join
+from pandas import DataFrame, Series
+from platform import python_version
+from time import perf_counter
+import tracemalloc
+from warnings import catch_warnings, simplefilter
+try:
+	from tools import WAPO_TYPE_MAP, MPV_TYPE_MAP, MPV_COLUMNS, MPV_REQUIRED_COLUMNS, is_complete
+	from pipeline import Pipeline, read_csv_chunks, rename, to_records, coerce, coerce_frame, check_foreign_key, validate, diff, write
+	from snapshot import TableSnapshot
+except ModuleNotFoundError:
+	from .tools import WAPO_TYPE_MAP, MPV_TYPE_MAP, MPV_COLUMNS, MPV_REQUIRED_COLUMNS, is_complete
+	from .pipeline import Pipeline, read_csv_chunks, rename, to_records, coerce, coerce_frame, check_foreign_key, validate, diff, write
+	from .snapshot import TableSnapshot
+
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+STATES = ("CA", "TX", "FL", "AZ", "GA", "CO", "OK", "OH", "NC", "WA", "TN", "MO", "IL", "LA", "NY", "PA", "AL", "NM", "KY", "SC",
+		  "VA", "IN", "NV", "OR", "MI", "AR", "MS", "WI", "MD", "UT", "NJ", "MN", "KS", "WV", "ID", "IA", "MT", "NE", "AK", "HI")
+CITIES = ("Los Angeles", "Houston", "Phoenix", "Chicago", "Las Vegas", "San Antonio", "Columbus", "Albuquerque", "Jacksonville",
+		  "St. Louis", "Tulsa", "Bakersfield", "Denver", "Oklahoma City", "Kansas City", "Austin", "Atlanta", "Tucson", "Miami", "Mesa")
+FIRST_NAMES = ("James", "Michael", "Robert", "John", "David", "William", "Richard", "Joseph", "Thomas", "Christopher", "Daniel",
+			   "Anthony", "Mark", "Jose", "Maria", "Jennifer", "Linda", "Patricia", "Elizabeth", "Juan", "Luis", "Tyrone", "Andre")
+LAST_NAMES = ("Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez", "Hernandez",
+			  "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "White", "Harris")
+WEAPONS = ("gun", "knife", "unarmed", "vehicle", "undetermined", "toy weapon", "machete", "sword", "baseball bat", "taser", "")
+
+
+def _choice(rng, values:dict, rows:int):
+	"""Picks ``rows`` values, where ``values`` is {value: share of the rows}. The shares do not have to add up to one."""
+	probabilities = Series(values.values(), dtype=float)
+	return rng.choice(list(values.keys()), size=rows, p=(probabilities / probabilities.sum()).to_numpy())
+
+
+def _blank(rng, column, share:float):
+	"""Replaces ``share`` of the values with an empty string, like the missing values in the real files"""
+	column = column.astype(object)
+	column[rng.random(len(column)) < share] = ""
+	return column
+
+
+def _dirty(rng, df:DataFrame, share:float) -> DataFrame:
+	"""Dirties ``share`` of the cells of every column that is not an id or date: changes their case, pads them with spaces, or replaces them with junk"""
+	for column in df.columns:
+		if column in ("id", "mpv_id", "wapo_id", "date"):
+			continue
+		values = df[column].astype(str).to_numpy(dtype=object)
+		kind = rng.integers(0, 3, len(values))
+		dirty = rng.random(len(values)) < share
+		values[dirty & (kind == 0)] = [value.lower() for value in values[dirty & (kind == 0)]]
+		values[dirty & (kind == 1)] = [f" {value} " for value in values[dirty & (kind == 1)]]
+		values[dirty & (kind == 2)] = "N/A"
+		df[column] = values
+	return df
+
+
+def _names(rng, rows:int):
+	return _blank(rng, rng.choice(FIRST_NAMES, rows).astype(object) + " " + rng.choice(LAST_NAMES, rows).astype(object), 0.04)
+
+
+def _dates(rng, rows:int, formats=("%Y-%m-%d", "%m/%d/%Y")):
+	"""Dates between 2015 and 2022, mostly in the first format"""
+	days = rng.integers(dt(2015, 1, 1).toordinal(), dt(2022, 12, 31).toordinal(), rows)
+	second = rng.random(rows) < 0.1
+	return [dt.fromordinal(int(day)).strftime(formats[1] if other else formats[0]) for day, other in zip(days, second)]
+
+
+def _coordinates(rng, rows:int):
+	return _blank(rng, rng.uniform(-124, -70, rows).round(3), 0.1), _blank(rng, rng.uniform(25, 49, rows).round(3), 0.1)
+
+
+def generate_wapo_data(file:str, rows:int, seed:int=0, dirty:float=0.01) -> str:
+	"""
+	Writes a synthetic Washington Post Fatal Force file with the columns of WAPO_TYPE_MAP, and about the same distributions, missing values, and date formats as the real one
+	:param int rows: The number of records. The ids are 1 to ``rows``.
+	:param float dirty: The share of cells that are dirtied with the wrong case, extra spaces, or junk.
+	:return: The file
+	"""
+	rng = default_rng(seed)
+	longitude, latitude = _coordinates(rng, rows)
+	df = DataFrame({"id": range(1, rows + 1), "name": _names(rng, rows), "date": _dates(rng, rows),
+					"manner_of_death": _choice(rng, {"shot": 0.95, "shot and Tasered": 0.05}, rows),
+					"weapon": rng.choice(WEAPONS, rows),
+					"age": _blank(rng, rng.integers(13, 85, rows), 0.04),
+					"gender": _choice(rng, {"M": 0.95, "F": 0.045, "": 0.005}, rows),
+					"race": _choice(rng, {"W": 0.42, "B": 0.22, "H": 0.15, "A": 0.02, "N": 0.015, "O": 0.005, "": 0.17}, rows),
+					"city": rng.choice(CITIES, rows), "state": rng.choice(STATES, rows),
+					"mental_illness_symptoms": _choice(rng, {"False": 0.77, "True": 0.23}, rows),
+					"threat_level": _choice(rng, {"attack": 0.63, "other": 0.32, "undetermined": 0.05}, rows),
+					"fleeing": _choice(rng, {"Not fleeing": 0.6, "Car": 0.16, "Foot": 0.13, "Other": 0.04, "": 0.07}, rows),
+					"body_camera": _choice(rng, {"False": 0.87, "True": 0.13}, rows),
+					"longitude": longitude, "latitude": latitude,
+					"exact_geocoding": _choice(rng, {"True": 0.98, "False": 0.02}, rows)})
+	_dirty(rng, df, dirty).to_csv(file, index=False)
+	return file
+
+
+def generate_mpv_data(file:str, rows:int, wapo_rows:int=0, seed:int=1, dirty:float=0.01) -> str:
+	"""
+	Writes a synthetic Mapping Police Violence file with the columns of MPV_COLUMNS, and about the same distributions, missing values, and date formats as the real one
+	:param int rows: The number of records. The MPV ids are 1 to ``rows``, with a few missing.
+	:param int wapo_rows: The number of records in the Washington Post file. About two thirds of the records link to one of them, up to the number of them, and one percent link to ids that do not exist.
+	:param float dirty: The share of cells that are dirtied with the wrong case, extra spaces, or junk.
+	:return: The file
+	"""
+	rng = default_rng(seed)
+	longitude, latitude = _coordinates(rng, rows)
+	wapo_id = full(rows, "", dtype=object)
+	link = rng.random(rows)
+	linked = flatnonzero((link >= 0.01) & (link < 0.67))[:wapo_rows]
+	wapo_id[linked] = rng.permutation(wapo_rows)[:len(linked)] + 1  # wapo_id is unique, so each Washington Post record is linked once at most
+	orphans = link < 0.01
+	wapo_id[orphans] = wapo_rows + 1 + rng.permutation(int(orphans.sum()))
+	mpv_id = _blank(rng, Series(range(1, rows + 1)).to_numpy(), 0.005)
+	df = DataFrame({"name": _names(rng, rows), "age": _blank(rng, rng.integers(13, 85, rows), 0.03),
+					"gender": _choice(rng, {"Male": 0.95, "Female": 0.045, "Transgender": 0.002, "Unknown": 0.003}, rows),
+					"race": _choice(rng, {"White": 0.4, "Black": 0.25, "Hispanic": 0.16, "Asian": 0.02, "Native American": 0.015,
+										  "Pacific Islander": 0.005, "Unknown Race": 0.15}, rows),
+					"date": _dates(rng, rows, ("%m/%d/%Y", "%Y-%m-%d")),
+					"street_address": _blank(rng, rng.integers(100, 9999, rows).astype(str).astype(object) + " Main St", 0.1),
+					"city": rng.choice(CITIES, rows), "state": rng.choice(STATES, rows),
+					"zip": _blank(rng, rng.integers(10000, 99999, rows), 0.05), "county": rng.choice(CITIES, rows) + " County",
+					"agency_responsible": rng.choice(CITIES, rows) + " Police Department",
+					"ori": rng.choice(STATES, rows).astype(object) + rng.integers(1000000, 9999999, rows).astype(str).astype(object),
+					"cause_of_death": _choice(rng, {"Gunshot": 0.9, "Gunshot, Taser": 0.05, "Taser": 0.03, "Physical Restraint": 0.02}, rows),
+					"disposition_official": _choice(rng, {"Pending investigation": 0.6, "Justified": 0.3, "Unreported": 0.1}, rows),
+					"signs_of_mental_illness": _choice(rng, {"No": 0.6, "Yes": 0.2, "Unknown": 0.2}, rows),
+					"allegedly_armed": _choice(rng, {"Allegedly Armed": 0.8, "Unarmed/Did Not Have Actual Weapon": 0.1, "Vehicle": 0.05, "Unclear": 0.05}, rows),
+					"wapo_armed": rng.choice(WEAPONS, rows),
+					"wapo_threat_level": _choice(rng, {"attack": 0.4, "other": 0.2, "undetermined": 0.05, "": 0.35}, rows),
+					"wapo_flee": _choice(rng, {"not fleeing": 0.4, "car": 0.1, "foot": 0.1, "": 0.4}, rows),
+					"wapo_body_camera": _choice(rng, {"no": 0.55, "yes": 0.1, "": 0.35}, rows),
+					"wapo_id": wapo_id,
+					"off_duty_killing": _choice(rng, {"": 0.97, "Off-Duty": 0.03}, rows),
+					"geography": _choice(rng, {"Suburban": 0.45, "Urban": 0.3, "Rural": 0.2, "": 0.05}, rows),
+					"mpv_id": mpv_id, "fe_id": _blank(rng, rng.permutation(rows) + 1, 0.3),
+					"encounter_type": _choice(rng, {"Violent Crime/Part 1": 0.4, "Traffic Stop": 0.1, "Mental Health/Welfare Check": 0.1, "Other Crimes": 0.4}, rows),
+					"call_for_service": _choice(rng, {"Yes": 0.6, "No": 0.3, "Unavailable": 0.1}, rows),
+					"tract": _blank(rng, rng.integers(1_000_000_000, 56_000_000_000, rows), 0.1),
+					"hhincome_median_census_tract": _blank(rng, rng.integers(15_000, 200_000, rows), 0.1),
+					"longitude": longitude, "latitude": latitude})
+	_dirty(rng, df, dirty).to_csv(file, index=False)
+	return file
+
+
+class MemoryTracer(object):
+	"""Keeps the peak memory that Python allocated while each stage of a pipeline was running, using tracemalloc"""
+	def __init__(self):
+		self.peaks = {}
+
+	def wrap(self, name:str, function):
+		def traced(*args):
+			tracemalloc.reset_peak()
+			result = function(*args)
+			self.peaks[name] = max(self.peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+			return result
+		return traced
+
+	def source(self, name:str, source):
+		iterator = iter(source)
+		next_chunk = self.wrap(name, next)
+		while True:
+			try:
+				yield next_chunk(iterator)
+			except StopIteration:
+				return
+
+	def trace(self, pipeline:Pipeline) -> Pipeline:
+		"""Wraps the source and every stage of the pipeline"""
+		pipeline.source = self.source(pipeline.source_name, pipeline.source)
+		for stage in pipeline.stages:
+			stage.function = self.wrap(stage.name, stage.function)
+		return pipeline
+
+
+def run_pipeline(benchmark:str, rows:int, pipeline:Pipeline, db, trace_memory:bool=True) -> list[dict]:
+	"""
+	Runs the pipeline, commits, and returns a result for each stage and one for the whole run, with its rows per second and peak memory in bytes
+	:param str benchmark: The name of the benchmark that the results are labeled with.
+	:param int rows: The number of rows in the file, that the results are labeled with.
+	"""
+	tracer = MemoryTracer()
+	if trace_memory:
+		tracer.trace(pipeline)
+		tracemalloc.start()
+	started = dt.now().isoformat(timespec="seconds")
+	start = perf_counter()
+	with catch_warnings():
+		simplefilter("ignore")  # The per-record warnings about default values would be timed along with the stages
+		pipeline.run()
+	db.commit()
+	seconds = perf_counter() - start
+	peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+	if trace_memory:
+		tracemalloc.stop()
+
+	labels = {"benchmark": benchmark, "rows": rows, "python": python_version(), "started": started}
+	results = [{**labels, **stats, "peak_memory": tracer.peaks.get(stats["stage"])} for stats in pipeline.stats()]
+	results.append({**labels, "stage": "total", "chunks": pipeline.chunks, "rows_in": pipeline.rows, "rows_out": pipeline.stages[-1].rows_out,
+					"seconds": seconds, "rows_per_second": pipeline.rows / seconds if seconds else None, "peak_memory": max(tracer.peaks.values(), default=peak)})
+	return results
+
+
+def benchmark_wapo(file:str, rows:int, backend, db, chunksize:int=1000, trace_memory:bool=True) -> tuple[list[dict], TableSnapshot]:
+	"""
+	Loads a Washington Post file the way upload_fatal_force does: parse, correct_dictionary_types, diff, and write
+	:param backend: The backend from database.backends that ``db`` belongs to, with its tables created.
+	:return: The results, and the snapshot of the table, whose ids are what the Mapping Police Violence records link to.
+	"""
+	snapshot = TableSnapshot("police_brutality.wapo_fatal_force", WAPO_TYPE_MAP)
+	cursor = backend.cursor(db)
+	pipeline = Pipeline(read_csv_chunks(file, chunksize=chunksize, names=list(WAPO_TYPE_MAP.keys()), header=0, dtype=str, keep_default_na=False),
+						to_records(), coerce(WAPO_TYPE_MAP), diff(snapshot), write(cursor, snapshot, backend=backend))
+	return run_pipeline("wapo", rows, pipeline, db, trace_memory), snapshot
+
+
+def benchmark_mpv(file:str, rows:int, backend, db, wapo_ids, chunksize:int=1000, trace_memory:bool=True) -> list[dict]:
+	"""
+	Loads a Mapping Police Violence file the way upload_mpv does: parse, correct_dataframe_types, the wapo_id check, diff, and write
+	:param backend: The backend from database.backends that ``db`` belongs to, with its tables created.
+	:param wapo_ids: The ids in police_brutality.wapo_fatal_force.
+	"""
+	snapshot = TableSnapshot("police_brutality.mapping_police_violence", MPV_TYPE_MAP)
+	cursor = backend.cursor(db)
+	pipeline = Pipeline(read_csv_chunks(file, chunksize=chunksize), rename(MPV_COLUMNS), coerce_frame(MPV_TYPE_MAP),
+						check_foreign_key("wapo_id", wapo_ids, policy="null"), to_records(fill_none=True),
+						validate(lambda dct: is_complete(dct, MPV_REQUIRED_COLUMNS)), diff(snapshot), write(cursor, snapshot, backend=backend))
+	return run_pipeline("mpv", rows, pipeline, db, trace_memory)
+
+
+def run_benchmarks(backend_factory, directory:str, sizes=SIZES, chunksize:int=1000, trace_memory:bool=True, output:str|None=None) -> list[dict]:
+	"""
+	Generates a Washington Post and a Mapping Police Violence file of each size, unless they were generated before, and loads both into a new database
+	:param backend_factory: A function that takes a folder and returns a backend for it, i.e. SQLiteBackend. Each size gets its own folder.
+	:param str directory: The folder that the files and databases are kept in.
+	:param bool trace_memory: Record the peak memory of each stage. tracemalloc slows the stages down, so turn it off to time them alone.
+	:param str output: A JSON lines file that the results are appended to, so runs can be compared. None prints them.
+	:return: The results
+	"""
+	results = []
+	for rows in sizes:
+		folder = join(directory, str(rows))
+		makedirs(folder, exist_ok=True)
+		wapo_file = join(folder, "wapo.csv")
+		mpv_file = join(folder, "mpv.csv")
+		if not exists(wapo_file):
+			generate_wapo_data(wapo_file, rows)
+		if not exists(mpv_file):
+			generate_mpv_data(mpv_file, rows, wapo_rows=rows)
+
+		backend = backend_factory(folder)
+		db = backend.connect()
+		backend.create_tables(db)
+		for table in ("mapping_police_violence", "wapo_fatal_force"):  # Every run starts from an empty table
+			db.execute(f"DELETE FROM police_brutality.{table}")
+		db.commit()
+
+		wapo_results, snapshot = benchmark_wapo(wapo_file, rows, backend, db, chunksize, trace_memory)
+		mpv_results = benchmark_mpv(mpv_file, rows, backend, db, snapshot.ids(), chunksize, trace_memory)
+		db.close()
+		for result in wapo_results + mpv_results:
+			line = dumps(result)
+			if output is None:
+				print(line)
+			else:
+				with open(output, 'a') as file:
+					file.write(line + "\n")
+		results += wapo_results + mpv_results
+	return results
+
+
+if __name__ == "__main__":
+	from ..backends import SQLiteBackend
+
+	directory = r"D:\data\SIR\benchmark"
+	sizes = SIZES
+	chunksize = 1000
+	trace_memory = True
+	output = r"D:\data\SIR\benchmark\results.jsonl"
+
+	run_benchmarks(SQLiteBackend, directory, sizes, chunksize, trace_memory, output)
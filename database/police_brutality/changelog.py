@@ -0,0 +1,100 @@
+from csv import DictWriter
+from json import dumps
+from os.path import splitext
+from sys import stdout
+from tabulate import tabulate
+from time import perf_counter
+try:
+	from tools import get_true_value
+except ModuleNotFoundError:
+	from .tools import get_true_value
+
+
+class ChangeLog(object):
+	"""
+	Collects every change an upload makes in memory, instead of printing a table per record, and writes them to a JSONL or CSV file in one go when flushed.
+	"""
+	FIELDS = ("table", "id", "column", "old", "new", "action")
+
+	def __init__(self, file:str|None=None, quiet:bool=False, progress_seconds:float=2.0, output=stdout):
+		"""
+		:param str file: The .jsonl or .csv file that the changes are appended to. None keeps them in memory only.
+		:param bool quiet: Do not print the progress line or the summary.
+		:param float progress_seconds: The least amount of time between two progress lines.
+		:param output: Where the progress line and the summary are printed.
+		"""
+		self.file = file
+		self.format = None if file is None else ("csv" if splitext(file)[1].lower() == ".csv" else "jsonl")
+		self.quiet = quiet
+		self.progress_seconds = progress_seconds
+		self.output = output
+		self.entries = []
+		self.counts = {}
+		self._written = 0
+		self._last_progress = None
+		self._start = perf_counter()
+
+	def __len__(self) -> int:
+		return sum(self.counts.values())
+
+	def __str__(self) -> str:
+		return f"Change log of {len(self):,} changes{'' if self.file is None else f' written to {self.file}'}"
+
+	def record(self, table_name:str, record_id, column:str|None, old, new, action:str):
+		"""
+		:param str action: What happened to the record: insert, update, or skip (it changed, but updating was turned off).
+		"""
+		self.entries.append({"table": table_name, "id": record_id, "column": column, "old": get_true_value(old), "new": get_true_value(new), "action": action})
+		key = (table_name, action, column)
+		self.counts[key] = self.counts.get(key, 0) + 1
+
+	def record_insert(self, table_name:str, dct:dict):
+		self.record(table_name, dct["id"], None, None, dct.get("name"), "insert")
+
+	def record_update(self, table_name:str, dct:dict, update_dict:dict, update:bool):
+		for column, (old, new) in update_dict.items():
+			self.record(table_name, dct["id"], column, old, new, "update" if update else "skip")
+
+	def mark(self) -> tuple[int, dict]:
+		"""The position to go back to with rollback(), if the changes recorded after it are rolled back by the database."""
+		return self._written + len(self.entries), dict(self.counts)
+
+	def rollback(self, mark:tuple[int, dict]):
+		"""Drops the changes recorded since ``mark``. It must be called before the next flush."""
+		if mark[0] < self._written:
+			raise RuntimeError(f"The changes since the mark have already been written to {self.file}, and cannot be rolled back")
+		self.entries = self.entries[:mark[0] - self._written]
+		self.counts = mark[1]
+
+	def progress(self, done:int, total:int|None=None, force:bool=False):
+		"""Prints a progress line, unless one was printed less than ``progress_seconds`` ago."""
+		now = perf_counter()
+		if self.quiet or (not force and self._last_progress is not None and now - self._last_progress < self.progress_seconds):
+			return
+		self._last_progress = now
+		rate = done / (now - self._start) if now > self._start else 0
+		print(f"{done:,}{'' if total is None else f'/{total:,}'} rows, {len(self):,} changes, {rate:,.0f} rows/s", file=self.output)
+
+	def flush(self):
+		"""Appends the changes collected since the last flush to the file."""
+		if self.file is not None and self.entries:
+			with open(self.file, 'a', newline="") as file:
+				if self.format == "csv":
+					writer = DictWriter(file, self.FIELDS)
+					if self._written == 0 and file.tell() == 0:
+						writer.writeheader()
+					writer.writerows(self.entries)
+				else:
+					file.write("".join(dumps(entry, default=str) + "\n" for entry in self.entries))
+			self._written += len(self.entries)
+			self.entries = []
+
+	def summary(self) -> str:
+		return tabulate([[table, action, column or "", count] for (table, action, column), count in sorted(self.counts.items(), key=lambda item: tuple(str(i) for i in item[0]))],
+						headers=("Table", "Action", "Column", "Records"))
+
+	def close(self):
+		"""Flushes the file and prints the summary."""
+		self.flush()
+		if not self.quiet:
+			print(self.summary(), file=self.output)
@@ -0,0 +1,99 @@
+from hashlib import sha1
+from json import dump, load
+from os import replace
+from os.path import exists
+try:
+	from tools import get_true_value
+	from pipeline import Stage
+except ModuleNotFoundError:
+	from .tools import get_true_value
+	from .pipeline import Stage
+
+
+def record_hash(dct:dict, columns) -> str:
+	"""A hash of a record's values, after its types have been corrected, in the order of ``columns``"""
+	return sha1("\x1f".join(str(get_true_value(dct[column])) for column in columns).encode()).hexdigest()
+
+
+class IngestState(object):
+	"""
+	The content hash of every record that has been committed, and how far into its file each table's last load got, saved in a local JSON file.
+	Hashes are only saved by commit(), which should be called right after the database commits, so the file never claims more than the database holds.
+	"""
+	def __init__(self, file:str):
+		"""
+		:param str file: The JSON file that the state is read from and saved to. It is created by the first commit if it does not exist.
+		"""
+		self.file = file
+		self.hashes = {}
+		self.offsets = {}
+		self._pending = {}
+		if exists(file):
+			with open(file) as f:
+				data = load(f)
+			self.hashes = data.get("hashes", {})
+			self.offsets = data.get("offsets", {})
+
+	def __str__(self) -> str:
+		return f"Ingest state in {self.file} for {', '.join(f'{table} ({len(hashes):,} records)' for table, hashes in self.hashes.items()) or 'no tables'}"
+
+	def offset(self, table_name:str) -> int:
+		"""The number of rows of the file that were committed by the last load of the table, if it was interrupted."""
+		return self.offsets.get(table_name, 0)
+
+	def is_unchanged(self, table_name:str, dct:dict, columns) -> bool:
+		"""
+		:return: True if the record has the same hash that was committed for its id.
+		"""
+		return self.hashes.get(table_name, {}).get(str(dct["id"])) == record_hash(dct, columns)
+
+	def stage(self, table_name:str, records, columns):
+		"""Holds the hashes of records that were written to the table until the next commit. Records that were not written, i.e. skipped updates, must not be staged, or the next load would take them as unchanged."""
+		pending = self._pending.setdefault(table_name, {})
+		for dct in records:
+			pending[str(dct["id"])] = record_hash(dct, columns)
+
+	def commit(self, table_name:str, offset:int):
+		"""Saves the held hashes and the number of rows of the file that have been committed for the table."""
+		for table, hashes in self._pending.items():
+			self.hashes.setdefault(table, {}).update(hashes)
+		self._pending = {}
+		self.offsets[table_name] = offset
+		self.save()
+
+	def rollback(self):
+		"""Drops the hashes held since the last commit."""
+		self._pending = {}
+
+	def discard(self, table_name:str, record_ids):
+		"""Drops the held hashes of records whose write was rolled back, so they are tried again by the next load."""
+		pending = self._pending.get(table_name, {})
+		for record_id in record_ids:
+			pending.pop(str(record_id), None)
+
+	def finish(self, table_name:str):
+		"""Marks the load of the table as complete, so the next load starts at the top of the file."""
+		self.offsets.pop(table_name, None)
+		self.save()
+
+	def save(self):
+		temporary = self.file + ".tmp"
+		with open(temporary, 'w') as f:
+			dump({"hashes": self.hashes, "offsets": self.offsets}, f)
+		replace(temporary, self.file)  # Replacing the file in one step means a crash never leaves half of it written
+
+
+def skip_unchanged(state:IngestState, table_name:str, columns) -> Stage:
+	"""Drops the records, whose types have already been corrected, that have not changed since they were last committed"""
+	return Stage("unchanged", lambda chunk: [dct for dct in chunk if not state.is_unchanged(table_name, dct, columns)])
+
+
+def stage_written(state:IngestState, table_name:str, columns, update:bool=True):
+	"""
+	A function for the on_write parameter of pipeline.write that stages the hashes of the records a plan actually wrote: its inserts, and its updates only if ``update`` is True.
+	"""
+	def function(plan):
+		state.stage(table_name, plan.inserts.values(), columns)
+		if update:
+			state.stage(table_name, (dct for dct, _ in plan.updates.values()), columns)
+	return function
@@ -0,0 +1,57 @@
+CREATE TABLE IF NOT EXISTS police_brutality.wapo_fatal_force(
+    id INT PRIMARY KEY UNIQUE NOT NULL,
+    name VARCHAR(80),
+    date DATE NOT NULL,
+    manner_of_death VARCHAR(20),
+    weapon VARCHAR(40),
+    age INT,
+    gender TEXT DEFAULT 'Unknown',
+    race TEXT DEFAULT 'Unknown',
+    city VARCHAR(40),
+    state CHAR(2) NOT NULL,
+    mental_illness_symptoms BOOLEAN NOT NULL,
+    threat_level TEXT DEFAULT 'Undetermined',
+    fleeing TEXT,
+    body_camera BOOLEAN NOT NULL,
+    longitude DECIMAL(6, 3),
+    latitude DECIMAL(5, 3),
+    exact_geocoding BOOLEAN NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS police_brutality.mapping_police_violence(
+    id INT PRIMARY KEY UNIQUE NOT NULL,
+    name VARCHAR(80) DEFAULT 'Name withheld by Police',
+    age INT,
+    gender TEXT DEFAULT 'Unknown',
+    race TEXT DEFAULT 'Unknown',
+    date DATE NOT NULL,
+    address VARCHAR(80),
+    city VARCHAR(40),
+    state VARCHAR(2),
+    zipcode INT,
+    county VARCHAR(40),
+    responsible_agency VARCHAR(200),
+    ori_agency_identifier VARCHAR(80),
+    cause_of_death VARCHAR(50),
+    official_disposition_of_death VARCHAR(200),
+    criminal_charges VARCHAR(100),
+    mental_illness_symptoms TEXT DEFAULT 'Unknown',
+    armed TEXT DEFAULT 'Unclear',
+    alleged_weapon VARCHAR(40),
+    alleged_threat_level TEXT DEFAULT 'Undetermined',
+    fleeing TEXT DEFAULT 'Unknown',
+    body_camera TEXT DEFAULT 'Unknown',
+    wapo_id INT UNIQUE,
+    fatal_encounters_id INT UNIQUE,
+    off_duty_killing BOOLEAN,
+    population_density TEXT DEFAULT 'Undetermined',
+    encounter_type VARCHAR(70),
+    call_for_service TEXT DEFAULT 'Unavailable',
+    census_tract INT,
+    census_tract_median_household_income INT,
+    longitude FLOAT,
+    latitude FLOAT,
+    FOREIGN KEY (wapo_id) REFERENCES wapo_fatal_force(id)
+);
+
+-- Skipping 'URL of image of victim', 'A brief description of the circumstances surrounding the death', 'Link to news article or photo of official document'
\ No newline at end of file
@@ -0,0 +1,160 @@
+from pandas import DataFrame, concat, isna
+try:
+	from tools import WAPO_TYPE_MAP, MPV_TYPE_MAP, MPV_COLUMNS, correct_dataframe_types
+	from pipeline import read_csv_chunks
+except ModuleNotFoundError:
+	from .tools import WAPO_TYPE_MAP, MPV_TYPE_MAP, MPV_COLUMNS, correct_dataframe_types
+	from .pipeline import read_csv_chunks
+
+
+class _Source(object):
+	"""The rows of one source, held as DataFrame chunks, with a hash index from a key column to the position of the key's latest row"""
+	def __init__(self, type_map:dict[str,type], key:str="id"):
+		self.columns = list(type_map.keys())
+		self.key = key
+		self.index = {}
+		self._frame = DataFrame(columns=self.columns)
+		self._chunks = []
+		self._rows = 0
+
+	def add(self, df:DataFrame) -> list[int]:
+		"""Appends the rows and points the index at them. A row whose key is already indexed replaces the old row."""
+		df = df[self.columns].reset_index(drop=True)
+		positions = list(range(self._rows, self._rows + len(df)))
+		for key, position in zip(df[self.key], positions):
+			if not isna(key):
+				self.index[key] = position
+		self._chunks.append(df)
+		self._rows += len(df)
+		return positions
+
+	@property
+	def frame(self) -> DataFrame:
+		"""Every row that was added, including the ones that were replaced. New chunks are only concatenated when the frame is asked for."""
+		if self._chunks:
+			self._frame = concat([self._frame] + self._chunks, ignore_index=True) if len(self._frame) else concat(self._chunks, ignore_index=True)
+			self._chunks = []
+		return self._frame
+
+	def take(self, positions:list, prefix:str) -> DataFrame:
+		"""The rows at the positions, with prefixed columns. A position of None is a row of missing values."""
+		return self.frame.reindex([-1 if position is None else position for position in positions]).reset_index(drop=True).add_prefix(prefix)
+
+
+class IncidentJoin(object):
+	"""
+	The Washington Post and Mapping Police Violence records, converted with their type maps, joined in memory on mapping_police_violence.wapo_id = wapo_fatal_force.id.
+	Both sources are hash indexed as rows are added, so new rows can be added at any time without rebuilding either index.
+	"""
+	def __init__(self, wapo_prefix:str="wapo_", mpv_prefix:str="mpv_", leave_dates_as_date:bool=True):
+		"""
+		:param str wapo_prefix: The prefix of the Washington Post columns in the joined records.
+		:param str mpv_prefix: The prefix of the Mapping Police Violence columns in the joined records.
+		:param bool leave_dates_as_date: Keep dates as datetime.date instead of %Y-%m-%d strings.
+		"""
+		self.wapo_prefix = wapo_prefix
+		self.mpv_prefix = mpv_prefix
+		self.leave_dates_as_date = leave_dates_as_date
+		self.wapo = _Source(WAPO_TYPE_MAP)
+		self.mpv = _Source(MPV_TYPE_MAP)
+		self.links = {}  # wapo_id: the position of the Mapping Police Violence row that links to it
+		self._linked_by = {}  # The position of a Mapping Police Violence row: the wapo_id that it links to
+		self.fallbacks = []
+
+	def __len__(self) -> int:
+		"""The number of Washington Post records that a Mapping Police Violence record links to"""
+		return sum(1 for wapo_id in self.links if wapo_id in self.wapo.index)
+
+	def __str__(self) -> str:
+		return f"{len(self.wapo.index):,} Washington Post and {len(self.mpv.index):,} Mapping Police Violence records, {len(self):,} linked"
+
+	def _convert(self, df, type_map:dict[str,type]) -> DataFrame:
+		if not isinstance(df, DataFrame):
+			df = DataFrame(list(df), columns=list(type_map.keys()))
+		df, fallbacks = correct_dataframe_types(df, type_map, leave_dates_as_date=self.leave_dates_as_date)
+		if len(fallbacks):
+			self.fallbacks.append(fallbacks)
+		return df
+
+	def add_wapo(self, df):
+		"""
+		Adds Washington Post records. A record with an id that was already added replaces it.
+		:param df: A DataFrame, or a list of records, with the columns of WAPO_TYPE_MAP, that has not been converted yet.
+		"""
+		self.wapo.add(self._convert(df, WAPO_TYPE_MAP))
+		return self
+
+	def add_mpv(self, df):
+		"""
+		Adds Mapping Police Violence records. A record with an id, or a wapo_id, that was already added replaces it.
+		:param df: A DataFrame, or a list of records, with the columns of MPV_TYPE_MAP (the table's, not the file's), that has not been converted yet.
+		"""
+		df = self._convert(df, MPV_TYPE_MAP)
+		for mpv_id in df["id"]:  # Drop the links of the rows that are about to be replaced
+			old_position = self.mpv.index.get(mpv_id)
+			old_wapo_id = self._linked_by.pop(old_position, None)
+			if old_wapo_id is not None and self.links.get(old_wapo_id) == old_position:
+				del self.links[old_wapo_id]
+		for wapo_id, position in zip(df["wapo_id"], self.mpv.add(df)):
+			if not isna(wapo_id):
+				self._linked_by.pop(self.links.get(int(wapo_id)), None)
+				self.links[int(wapo_id)] = position
+				self._linked_by[position] = int(wapo_id)
+		return self
+
+	def load_wapo(self, file:str, chunksize:int=10_000):
+		"""Adds every record of a Washington Post file, in the column order of WAPO_TYPE_MAP, ``chunksize`` rows at a time"""
+		for chunk in read_csv_chunks(file, chunksize=chunksize, names=list(WAPO_TYPE_MAP.keys()), header=0, dtype=str, keep_default_na=False):
+			self.add_wapo(chunk)
+		return self
+
+	def load_mpv(self, file:str, chunksize:int=10_000):
+		"""Adds every record of a Mapping Police Violence file, whose columns are renamed with MPV_COLUMNS, ``chunksize`` rows at a time"""
+		for chunk in read_csv_chunks(file, chunksize=chunksize, usecols=list(MPV_COLUMNS.keys())):
+			self.add_mpv(chunk.rename(columns=MPV_COLUMNS))
+		return self
+
+	def _pairs(self, how:str) -> tuple[list, list]:
+		if how not in ("inner", "left", "right", "outer"):
+			raise ValueError(f"how must be inner, left, right, or outer, not {how}")
+		wapo_positions = []
+		mpv_positions = []
+		if how in ("inner", "right"):
+			keys = [wapo_id for wapo_id in self.links if wapo_id in self.wapo.index] if how == "inner" else list(self.links)
+		else:
+			keys = list(self.wapo.index)
+		for wapo_id in keys:
+			wapo_positions.append(self.wapo.index.get(wapo_id))
+			mpv_positions.append(self.links.get(wapo_id))
+		if how in ("right", "outer"):  # Mapping Police Violence records that do not link to anything
+			for position in sorted(set(self.mpv.index.values()) - set(self._linked_by)):
+				wapo_positions.append(None)
+				mpv_positions.append(position)
+		if how == "outer":
+			keys = set(keys)
+			for wapo_id, position in self.links.items():
+				if wapo_id not in keys:
+					wapo_positions.append(None)
+					mpv_positions.append(position)
+		return wapo_positions, mpv_positions
+
+	def join(self, how:str="inner") -> DataFrame:
+		"""
+		The joined records, with the Washington Post columns first
+		:param str how: inner keeps the linked records, left keeps every Washington Post record, right keeps every Mapping Police Violence record, and outer keeps both.
+		"""
+		wapo_positions, mpv_positions = self._pairs(how)
+		return concat([self.wapo.take(wapo_positions, self.wapo_prefix), self.mpv.take(mpv_positions, self.mpv_prefix)], axis=1)
+
+	def lookup(self, wapo_id:int) -> dict|None:
+		"""The joined record of one Washington Post id, or None if neither source has it"""
+		wapo_position = self.wapo.index.get(wapo_id)
+		mpv_position = self.links.get(wapo_id)
+		if wapo_position is None and mpv_position is None:
+			return None
+		joined = concat([self.wapo.take([wapo_position], self.wapo_prefix), self.mpv.take([mpv_position], self.mpv_prefix)], axis=1).astype(object)
+		return joined.where(joined.notna(), None).iloc[0].to_dict()
+
+	@classmethod
+	def from_files(cls, wapo_file:str, mpv_file:str, chunksize:int=10_000, **kwargs):
+		return cls(**kwargs).load_wapo(wapo_file, chunksize).load_mpv(mpv_file, chunksize)
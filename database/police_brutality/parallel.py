@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector.pooling import CNX_POOL_MAXSIZE, MySQLConnectionPool
+try:
+	from tools import upsert_records
+except ModuleNotFoundError:
+	from .tools import upsert_records
+
+
+def _shard_key(dct:dict) -> int|None:
+	"""The record's id as an int, or None if it does not have one that can be read, i.e. an MPV record without an mpv_id"""
+	try:
+		return int(float(dct["id"]))
+	except (KeyError, ValueError, TypeError, OverflowError):  # OverflowError is float("inf")
+		return None
+
+
+def shard_by_id(records, shards:int, on_reject=None) -> list[list[dict]]:
+	"""
+	Splits records into ``shards`` contiguous id ranges that each hold about the same number of records
+	:param on_reject: An optional function that is called with each record that does not have an id. Those records are left out of every shard.
+	:return: A list of shards, each sorted by id. Empty shards are left out.
+	"""
+	keyed = []
+	for dct in records:
+		key = _shard_key(dct)
+		if key is None:
+			if on_reject is not None:
+				on_reject(dct)
+		else:
+			keyed.append((key, dct))
+	keyed.sort(key=lambda item: item[0])
+	records = [dct for _, dct in keyed]
+	size, remainder = divmod(len(records), shards)
+	result = []
+	start = 0
+	for shard in range(shards):
+		end = start + size + (1 if shard < remainder else 0)
+		if end > start:
+			result.append(records[start:end])
+		start = end
+	return result
+
+
+def _upload_shard(pool:MySQLConnectionPool, records:list[dict], type_map:dict[str,type], table_name:str, update:bool=True, snapshot=None, **kwargs) -> dict[str,int]:
+	db = pool.get_connection()
+	try:
+		cursor = db.cursor(buffered=True)
+		plans = []
+		counts = upsert_records(cursor, records, type_map, table_name, update=update, snapshot=snapshot, plans=plans, **kwargs)
+		db.commit()
+		if snapshot is not None:  # Only once the range is committed, so a range that is rolled back leaves the snapshot as it was
+			for plan in plans:
+				snapshot.apply(plan, update=update)
+		return counts
+	except Exception:
+		db.rollback()
+		raise
+	finally:
+		db.close()  # Returns the connection to the pool
+
+
+def parallel_upsert_records(records, type_map:dict[str,type], table_name:str, pool_kwargs:dict, workers:int=4, update:bool=True, chunk_size:int=1000, snapshot=None, on_reject=None) -> tuple[dict[str,int], list[tuple]]:
+	"""
+	Uploads records with upsert_records on ``workers`` threads at once. The records are split into id ranges, and each range is written on its own pooled connection and committed in its own transaction.
+	:param records: An iterable of dictionaries, in the same format that the single record uploaders take.
+	:param dict type_map: A dictionary holding the correct type for each column. The column is the key and the type is the value.
+	:param str table_name: The fully qualified name of the table, i.e. police_brutality.wapo_fatal_force
+	:param dict pool_kwargs: The keyword arguments for the connection pool, i.e. get_pool_kwargs(). The pool size is raised to ``workers`` if it is smaller.
+	:param int workers: The number of threads, and id ranges. At most CNX_POOL_MAXSIZE (32), the largest pool mysql.connector allows.
+	:param bool update: if the database should update the record if the id is already being used.
+	:param int chunk_size: The number of records that are looked up and written in each round trip.
+	:param snapshot: An optional TableSnapshot of the table, shared by every thread. Each range's writes are recorded in it once the range commits.
+	:param on_reject: An optional function that is called with each record that does not have an id, instead of the whole upload failing. Those records are not written.
+	:return: The number of records that were inserted, updated, skipped, and left unchanged across every range that was committed, and a list of (first id, last id, exception) for every range that was rolled back.
+	"""
+	if not 0 < workers <= CNX_POOL_MAXSIZE:
+		raise ValueError(f"workers must be between 1 and {CNX_POOL_MAXSIZE}, not {workers}")
+	pool_kwargs = dict(pool_kwargs)
+	pool_kwargs["pool_size"] = min(max(pool_kwargs.get("pool_size", workers), workers), CNX_POOL_MAXSIZE)
+	pool = MySQLConnectionPool(**pool_kwargs)
+
+	counts = {"inserted": 0, "updated": 0, "skipped": 0, "unchanged": 0}
+	errors = []
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		futures = [(shard, executor.submit(_upload_shard, pool, shard, type_map, table_name, update=update, chunk_size=chunk_size, snapshot=snapshot))
+				   for shard in shard_by_id(records, workers, on_reject)]
+		for shard, future in futures:
+			try:
+				shard_counts = future.result()
+			except Exception as e:
+				errors.append((_shard_key(shard[0]), _shard_key(shard[-1]), e))
+				continue
+			for key, value in shard_counts.items():
+				counts[key] += value
+	return counts, errors
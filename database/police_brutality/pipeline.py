@@ -0,0 +1,223 @@
+from pandas import NA, Index, read_csv
+from tabulate import tabulate
+from time import perf_counter
+try:
+	from tools import ChangePlan, correct_dataframe_types, correct_dictionary_types, frame_to_records, write_plan
+except ModuleNotFoundError:
+	from .tools import ChangePlan, correct_dataframe_types, correct_dictionary_types, frame_to_records, write_plan
+
+
+class Stage(object):
+	"""One step of a Pipeline. It takes a chunk of rows and returns the chunk that is passed on to the next stage."""
+	def __init__(self, name:str, function):
+		"""
+		:param str name: The name shown in the pipeline's report.
+		:param function: A function that takes a chunk (DataFrame, list of records, or ChangePlan) and returns the next chunk.
+		"""
+		self.name = name
+		self.function = function
+		self.chunks = 0
+		self.rows_in = 0
+		self.rows_out = 0
+		self.seconds = 0.0
+
+	def __call__(self, chunk):
+		start = perf_counter()
+		result = self.function(chunk)
+		self.seconds += perf_counter() - start
+		self.chunks += 1
+		self.rows_in += len(chunk)
+		self.rows_out += len(result)
+		return result
+
+	def __str__(self) -> str:
+		return f"{self.name}: {self.rows_in:,} rows in, {self.rows_out:,} rows out in {self.seconds:.3f}s"
+
+	def stats(self) -> dict:
+		return {"stage": self.name, "chunks": self.chunks, "rows_in": self.rows_in, "rows_out": self.rows_out, "seconds": self.seconds,
+				"rows_per_second": self.rows_in / self.seconds if self.seconds else None}
+
+
+class Pipeline(object):
+	"""Passes chunks from a source through a series of stages, one chunk at a time, so only one chunk is in memory at once"""
+	def __init__(self, source, *stages:Stage, source_name:str="read"):
+		"""
+		:param source: An iterable of chunks, i.e. read_csv_chunks(...)
+		:param Stage stages: The stages, in the order they are run.
+		:param str source_name: The name of the source in the pipeline's report.
+		"""
+		self.source = source
+		self.stages = stages
+		self.source_name = source_name
+		self.chunks = 0
+		self.rows = 0
+		self.seconds = 0.0
+
+	def __iter__(self):
+		iterator = iter(self.source)
+		while True:
+			start = perf_counter()
+			try:
+				chunk = next(iterator)
+			except StopIteration:
+				self.seconds += perf_counter() - start
+				return
+			self.seconds += perf_counter() - start
+			self.chunks += 1
+			self.rows += len(chunk)
+
+			for stage in self.stages:
+				if not len(chunk):
+					break
+				chunk = stage(chunk)
+			yield chunk
+
+	def run(self):
+		"""Runs the pipeline until the source is exhausted, and returns the pipeline."""
+		for _ in self:
+			pass
+		return self
+
+	def stats(self) -> list[dict]:
+		source = {"stage": self.source_name, "chunks": self.chunks, "rows_in": self.rows, "rows_out": self.rows, "seconds": self.seconds,
+				  "rows_per_second": self.rows / self.seconds if self.seconds else None}
+		return [source] + [stage.stats() for stage in self.stages]
+
+	def report(self) -> str:
+		return tabulate([[stat["stage"], stat["chunks"], stat["rows_in"], stat["rows_out"], stat["seconds"], stat["rows_per_second"]] for stat in self.stats()],
+						headers=("Stage", "Chunks", "Rows In", "Rows Out", "Seconds", "Rows/Second"), floatfmt=",.3f")
+
+
+def read_csv_chunks(file:str, chunksize:int=1000, **kwargs):
+	"""Reads a csv file ``chunksize`` rows at a time. The keyword arguments are passed on to pandas.read_csv"""
+	with read_csv(file, chunksize=chunksize, **kwargs) as reader:
+		yield from reader
+
+
+def rename(columns:dict[str,str]) -> Stage:
+	"""Keeps only the given columns of a DataFrame chunk, renamed and in the order of the dictionary: {file column: table column}"""
+	return Stage("rename", lambda chunk: chunk.filter(columns.keys(), axis=1).rename(columns=columns)[list(columns.values())])
+
+
+def to_records(fill_none:bool=False) -> Stage:
+	"""
+	Turns a DataFrame chunk into a list of records
+	:param bool fill_none: Replace missing values with None. Use this after coerce_frame, whose chunks are already converted.
+	"""
+	return Stage("records", frame_to_records if fill_none else lambda chunk: chunk.to_dict("records"))
+
+
+def coerce(type_map:dict[str,type], prepare=None, leave_dates_as_date:bool=False) -> Stage:
+	"""
+	Corrects the types of a list of records with correct_dictionary_types
+	:param prepare: An optional function that is called on each record after its types are corrected, and returns the record.
+	:param bool leave_dates_as_date: Keep dates as datetime.date instead of %Y-%m-%d strings. A TableSnapshot holds strings, so leave this off before diff.
+	"""
+	def function(chunk):
+		chunk = [correct_dictionary_types(dct, type_map, leave_dates_as_date=leave_dates_as_date) for dct in chunk]
+		return chunk if prepare is None else [prepare(dct) for dct in chunk]
+	return Stage("coerce", function)
+
+
+def coerce_frame(type_map:dict[str,type], prepare=None, on_fallback=None, leave_dates_as_date:bool=False) -> Stage:
+	"""
+	Corrects the types of a DataFrame chunk one column at a time with correct_dataframe_types
+	:param prepare: An optional function that is called on the converted DataFrame, and returns the DataFrame.
+	:param on_fallback: An optional function that is called with the DataFrame of values that were given a default value, when there are any.
+	:param bool leave_dates_as_date: Keep dates as datetime.date instead of %Y-%m-%d strings. A TableSnapshot holds strings, so leave this off before diff.
+	"""
+	def function(chunk):
+		chunk, fallbacks = correct_dataframe_types(chunk, type_map, leave_dates_as_date=leave_dates_as_date)
+		if on_fallback is not None and len(fallbacks):
+			on_fallback(fallbacks)
+		return chunk if prepare is None else prepare(chunk)
+	return Stage("coerce", function)
+
+
+def check_foreign_key(column:str, ids, policy:str="reject", on_reject=None) -> Stage:
+	"""
+	Checks a column of a DataFrame chunk against the ids of the table it points to, with one vectorized lookup per chunk, so that no row is sent that the database would refuse
+	:param str column: The foreign key column, i.e. wapo_id. Missing values are not checked.
+	:param ids: The ids that exist in the other table, i.e. load_ids(...) or the ids() of its TableSnapshot.
+	:param str policy: "reject" drops the rows whose id does not exist, and "null" keeps them with the column set to missing.
+	:param on_reject: An optional function that is called with the DataFrame of rows whose id does not exist, before the policy is applied.
+	"""
+	if policy not in ("reject", "null"):
+		raise ValueError(f"The policy must be reject or null, not {policy}")
+	ids = Index(list(ids))  # Built once, instead of converting the set for every chunk
+
+	def function(chunk):
+		missing = chunk[column].notna() & ~chunk[column].isin(ids)
+		if not missing.any():
+			return chunk
+		if on_reject is not None:
+			on_reject(chunk[missing])
+		if policy == "reject":
+			return chunk[~missing]
+		chunk = chunk.copy()
+		chunk.loc[missing, column] = NA
+		return chunk
+	return Stage("foreign key", function)
+
+
+def validate(predicate, on_reject=None) -> Stage:
+	"""
+	Drops the records that the predicate returns False for
+	:param on_reject: An optional function that is called with each dropped record.
+	"""
+	def function(chunk):
+		kept = []
+		for dct in chunk:
+			if predicate(dct):
+				kept.append(dct)
+			elif on_reject is not None:
+				on_reject(dct)
+		return kept
+	return Stage("validate", function)
+
+
+def diff(snapshot) -> Stage:
+	"""Turns a list of records into a ChangePlan by comparing them against a TableSnapshot"""
+	return Stage("diff", snapshot.plan)
+
+
+def write(cursor, snapshot, update:bool=True, backend=None, transactions=None, on_error=None, changelog=None, on_write=None) -> Stage:
+	"""
+	Writes each ChangePlan into the snapshot's table and records it in the snapshot. The stage's ``counts`` attribute holds the number of records that were inserted, updated, skipped, and left unchanged.
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:param transactions: An optional database.TransactionManager. Each plan is written as one of its batches, and a plan whose batch is rolled back is neither counted nor recorded in the snapshot.
+	:param on_error: An optional function that is called with the plan and the batch's result when a plan is rolled back.
+	:param changelog: An optional ChangeLog that the changes are recorded in, instead of being printed. The changes of a plan that is rolled back are dropped from it.
+	:param on_write: An optional function that is called with each plan that was written and not rolled back, i.e. checkpoint.stage_written(...)
+	"""
+	stage = None
+
+	def write_counts(plan:ChangePlan):
+		for key, value in write_plan(cursor, plan, snapshot.columns, snapshot.table_name, update=update, backend=backend, changelog=changelog).items():
+			stage.counts[key] += value
+
+	def function(plan:ChangePlan):
+		if transactions is None:
+			write_counts(plan)
+		else:
+			counts = dict(stage.counts)
+			mark = None if changelog is None else changelog.mark()
+			with transactions.batch(len(plan)) as result:
+				try:
+					write_counts(plan)
+				except Exception:
+					if changelog is not None:  # Dropped before the batch ends, so no commit can flush the changes that are being rolled back
+						changelog.rollback(mark)
+					raise
+			if result["error"] is not None:
+				stage.counts = counts
+				if on_error is not None:
+					on_error(plan, result)
+				return plan
+		snapshot.apply(plan, update=update)
+		if on_write is not None:
+			on_write(plan)
+		return plan
+	stage = Stage("write", function)
+	stage.counts = {"inserted": 0, "updated": 0, "skipped": 0, "unchanged": 0}
+	return stage
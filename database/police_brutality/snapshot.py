@@ -0,0 +1,82 @@
+try:
+	from tools import ChangePlan, correct_dictionary_types
+except ModuleNotFoundError:
+	from .tools import ChangePlan, correct_dictionary_types
+
+
+class TableSnapshot(object):
+	"""An in-memory copy of a table, keyed by id, holding values that have already been through correct_dictionary_types"""
+	def __init__(self, table_name:str, type_map:dict[str,type]):
+		"""
+		:param str table_name: The fully qualified name of the table, i.e. police_brutality.wapo_fatal_force
+		:param dict type_map: A dictionary holding the correct type for each column. The column is the key and the type is the value.
+		"""
+		self.table_name = table_name
+		self.type_map = type_map
+		self.columns = tuple(type_map.keys())
+		self.index = {}
+
+	def __len__(self) -> int:
+		return len(self.index)
+
+	def __contains__(self, record_id) -> bool:
+		return record_id in self.index
+
+	def __getitem__(self, record_id) -> dict:
+		return self.index[record_id]
+
+	def __str__(self) -> str:
+		return f"Snapshot of {len(self):,} records from {self.table_name}"
+
+	def ids(self) -> set:
+		return set(self.index.keys())
+
+	def load(self, cursor, fetch_size:int=5000):
+		"""
+		Reads the whole table in one scan. Pass an unbuffered cursor (``db.cursor()``) so that the rows are streamed ``fetch_size`` at a time instead of being held by the cursor.
+		"""
+		self.index = {}
+		cursor.execute(f"SELECT {','.join(self.columns)} FROM {self.table_name}")
+		while rows := cursor.fetchmany(fetch_size):
+			for row in rows:
+				original = correct_dictionary_types(dict(zip(self.columns, row)), self.type_map, leave_dates_as_date=False)
+				self.index[original["id"]] = original
+		return self
+
+	def diff(self, dct:dict) -> dict|None:
+		"""
+		:param dict dct: A record whose types have already been corrected.
+		:return: None if the id is not stored yet, otherwise the columns that changed mapped to (current, new).
+		"""
+		original = self.index.get(dct["id"])
+		if original is None:
+			return None
+		return {key: (original[key], dct[key]) for key in self.columns if original[key] != dct[key]}
+
+	def plan(self, records) -> ChangePlan:
+		"""Diffs every record, whose types have already been corrected, against the snapshot."""
+		plan = ChangePlan()
+		for dct in records:
+			plan.add(dct, self.index.get(dct["id"]), self.columns)
+		return plan
+
+	def apply(self, plan:ChangePlan, update:bool=True):
+		"""Records the writes of a plan in the snapshot once they have been sent to the database."""
+		for record_id, dct in plan.inserts.items():
+			self.index[record_id] = {key: dct[key] for key in self.columns}
+		if update:
+			for record_id, (dct, _) in plan.updates.items():
+				self.index[record_id] = {key: dct[key] for key in self.columns}
+
+	@classmethod
+	def from_cursor(cls, cursor, table_name:str, type_map:dict[str,type], fetch_size:int=5000):
+		return cls(table_name, type_map).load(cursor, fetch_size)
+
+
+def load_ids(cursor, table_name:str, column:str="id", fetch_size:int=5000) -> set:
+	"""Reads every value of one column of a table, i.e. the ids that another table's foreign key can point to, in one scan"""
+	cursor.execute(f"SELECT {column} FROM {table_name}")
+	ids = set()
+	while rows := cursor.fetchmany(fetch_size):
+		ids.update(row[0] for row in rows)
+	return ids
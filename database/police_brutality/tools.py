@@ -1,6 +1,11 @@
 from datetime import datetime as dt, date
 from enum import Enum
-from numpy import isnan
+from functools import lru_cache
+from itertools import islice
+from numpy import isnan, trunc
+from pandas import DataFrame, DatetimeIndex, NaT, Series, concat, to_datetime, to_numeric
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+from tabulate import tabulate
 from warnings import warn
 
 
@@ -58,6 +63,33 @@ class PopulationDensity(Enum):
 	Undetermined = "Undetermined"
 
 
+# The type of each column of police_brutality.wapo_fatal_force, in the order of the Washington Post's file
+WAPO_TYPE_MAP = {"id": int, "name": str, "date": date, "manner_of_death": str, "weapon": str, "age": int, "gender": Gender,
+				 "race": Race, "city": str, "state": str, "mental_illness_symptoms": bool, "threat_level": ThreatLevel,
+				 "fleeing": Flee, "body_camera": bool, "longitude": float, "latitude": float, "exact_geocoding": bool}
+
+# The type of each column of police_brutality.mapping_police_violence
+MPV_TYPE_MAP = {"name":str, "age":int, "gender":Gender, "race":Race,"date":date, "address":str, "city":str, "state":str,
+				"zipcode":int, "county":str, "responsible_agency":str, "ori_agency_identifier":str, "cause_of_death":str,
+				"official_disposition_of_death":str, "mental_illness_symptoms":bool, "armed":Armed, "alleged_weapon":str,
+				"alleged_threat_level":ThreatLevel, "fleeing":Flee, "body_camera":bool, "wapo_id":int, "off_duty_killing":bool,
+				"population_density":PopulationDensity, "id":int, "fatal_encounters_id":int, "encounter_type":str,
+				"call_for_service":bool, "census_tract":int, "census_tract_median_household_income":int, "longitude":float, "latitude":float}
+
+# The columns of police_brutality.mapping_police_violence that are NOT NULL
+MPV_REQUIRED_COLUMNS = ("id", "date")
+
+# The columns of the Mapping Police Violence file that are uploaded: {file column: table column}
+MPV_COLUMNS = {"name": "name", "age": "age", "gender": "gender", "race": "race", "date": "date", "street_address": "address",
+			   "city": "city", "state": "state", "zip": "zipcode", "county": "county", "agency_responsible": "responsible_agency",
+			   "ori": "ori_agency_identifier", "cause_of_death": "cause_of_death", "disposition_official": "official_disposition_of_death",
+			   "signs_of_mental_illness": "mental_illness_symptoms", "allegedly_armed": "armed", "wapo_armed": "alleged_weapon",
+			   "wapo_threat_level": "alleged_threat_level", "wapo_flee": "fleeing", "wapo_body_camera": "body_camera", "wapo_id": "wapo_id",
+			   "off_duty_killing": "off_duty_killing", "geography": "population_density", "mpv_id": "id", "fe_id": "fatal_encounters_id",
+			   "encounter_type": "encounter_type", "call_for_service": "call_for_service", "tract": "census_tract",
+			   "hhincome_median_census_tract": "census_tract_median_household_income", "longitude": "longitude", "latitude": "latitude"}
+
+
 def get_true_value(obj):
 	if isinstance(obj, date):
 		return obj.strftime("%Y-%m-%d")
@@ -78,6 +110,55 @@ def check_is_none(value) -> bool:
 	return False
 
 
+# The formats that dates are read in. The files use the first, and the CSV Reader may change them to the second.
+DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d")
+
+
+@lru_cache(maxsize=16384)
+def parse_date(value:str) -> date:
+	"""
+	Reads a date in any of the DATE_FORMATS. Many records share a date, so the result of each string is cached.
+	:raises ValueError: If the string is not in any of the formats.
+	"""
+	for date_format in DATE_FORMATS:
+		try:
+			return dt.strptime(value, date_format).date()
+		except ValueError:
+			pass
+	raise ValueError(f"time data {value!r} does not match any of the formats {DATE_FORMATS}")
+
+
+@lru_cache(maxsize=16384)
+def parse_date_string(value:str) -> str:
+	"""parse_date, written back as %Y-%m-%d"""
+	return parse_date(value).isoformat()
+
+
+def detect_date_format(values, formats=DATE_FORMATS, sample:int=20) -> str|None:
+	"""The first format that reads every value of the first ``sample`` values, or the one that reads the most of them. None if no format reads any."""
+	sample = Series(values[:sample] if not isinstance(values, Series) else values.iloc[:sample], dtype="string").dropna()
+	counts = [to_datetime(sample, format=date_format, errors="coerce").notna().sum() for date_format in formats]
+	if not len(sample) or not max(counts):
+		return None
+	return formats[counts.index(max(counts))]
+
+
+def parse_date_column(column:Series, formats=DATE_FORMATS) -> Series:
+	"""
+	Reads a column of date strings in one vectorized call per format. Only the unique strings are read, starting with the format that detect_date_format picks, and the other formats are only tried on the strings that it could not read.
+	:return: A datetime64 Series with NaT for the missing values and the strings that are not in any of the formats.
+	"""
+	uniques = Series(column.dropna().unique(), dtype="string")
+	detected = detect_date_format(uniques, formats)
+	days = Series(NaT, index=uniques.index, dtype="datetime64[ns]")
+	for date_format in ((detected,) + tuple(f for f in formats if f != detected) if detected else formats):
+		remaining = days.isna()
+		if not remaining.any():
+			break
+		days[remaining] = to_datetime(uniques[remaining], format=date_format, errors="coerce")
+	return column.astype("string").map(Series(days.to_numpy(), index=uniques.to_numpy())).astype("datetime64[ns]")
+
+
 def correct_dictionary_types(raw_dct, correct_type_dct:dict[str,type], **kwargs) -> dict:
 	leave_dates_as_date = kwargs.get("leave_dates_as_date", False)
 
@@ -85,11 +166,11 @@ def correct_dictionary_types(raw_dct, correct_type_dct:dict[str,type], **kwargs)
 		raw_value = raw_dct[key]
 		match correct_type.__name__:
 			case "str":
-				if not raw_value:
+				if check_is_none(raw_value) or not raw_value:
 					raw_dct[key] = None
 			case "int":
 				try:
-					new_value = int(raw_value)
+					new_value = None if isinstance(raw_value, float) and not raw_value.is_integer() else int(raw_value)  # 3.5 is not an int, and is not cut to 3
 				except (ValueError, TypeError):
 					new_value = None
 				raw_dct[key] = new_value
@@ -104,14 +185,10 @@ def correct_dictionary_types(raw_dct, correct_type_dct:dict[str,type], **kwargs)
 			case "bool":
 				raw_dct[key] = convert_to_boolean(raw_value)
 			case "date":
-				if not isinstance(raw_value, date):
-					try:
-						day = dt.strptime(raw_value, "%m/%d/%Y")
-					except ValueError:
-						day = dt.strptime(raw_value, "%Y-%m-%d")  # CSV Reader may change the format
+				if isinstance(raw_value, date):
+					raw_dct[key] = raw_value if leave_dates_as_date else raw_value.strftime("%Y-%m-%d")
 				else:
-					day = raw_value
-				raw_dct[key] = day if leave_dates_as_date else day.strftime("%Y-%m-%d")
+					raw_dct[key] = parse_date(raw_value) if leave_dates_as_date else parse_date_string(raw_value)
 			case "Gender":
 				try:
 					raw_dct[key] = convert_to_gender(raw_value)
@@ -151,8 +228,13 @@ def correct_dictionary_types(raw_dct, correct_type_dct:dict[str,type], **kwargs)
 	return raw_dct
 
 
-def generate_placeholders(number:int) -> str:
-	return ("%s," * number).rstrip(",")
+def generate_placeholders(number:int, placeholder:str="%s") -> str:
+	return ((placeholder + ",") * number).rstrip(",")
+
+
+def get_placeholder(backend=None) -> str:
+	"""The parameter marker of a backend from database.backends. None is the MySQL server."""
+	return "%s" if backend is None else backend.placeholder
 
 
 def convert_to_boolean(value:str|int) -> bool:
@@ -166,17 +248,54 @@ def convert_to_boolean(value:str|int) -> bool:
 	return value == "true" or value == "yes"
 
 
+def _build_enum_aliases(enum) -> dict:
+	aliases = {}
+	for attribute in ("value", "name"):  # Names are added last so that they win, like they did when the members were searched by name first
+		for e in enum:
+			aliases[getattr(e, attribute).replace("_", ' ').upper()] = e
+	return aliases
+
+
+ENUM_ALIASES = {enum: _build_enum_aliases(enum) for enum in (Gender, Race, ThreatLevel, Flee, Armed, PopulationDensity)}
+
+
+def register_enum_alias(enum, alias:str, member):
+	"""
+	Adds another spelling that converts to a member of one of the custom enumerations, i.e. register_enum_alias(Race, "Unknown Race", Race.U)
+	:param enum: The enumeration, i.e. Race
+	:param str alias: The spelling. It is matched without case sensitivity.
+	:param member: The member that the alias converts to.
+	"""
+	if enum not in ENUM_ALIASES:
+		ENUM_ALIASES[enum] = _build_enum_aliases(enum)
+	ENUM_ALIASES[enum][alias.upper()] = member
+
+
+# The MPV database spells the unknown race "Unknown Race", while the race column of both tables only has "Unknown". Registered here, so every user of MPV_TYPE_MAP gets it.
+register_enum_alias(Race, "Unknown Race", Race.U)
+register_enum_alias(Race, "UR", Race.U)
+
+
 def convert_to_custom_enum(value:str, enum, none_value):
 	if isinstance(value, enum):
 		return value
 	if check_is_none(value):
 		return none_value
-	value = value.upper()
-	for attribute in ("name", "value"):
-		for e in enum:
-			if value == getattr(e, attribute).replace("_", ' ').upper():
-				return e
-	return None
+	if enum not in ENUM_ALIASES:
+		ENUM_ALIASES[enum] = _build_enum_aliases(enum)
+	return ENUM_ALIASES[enum].get(value.upper())
+
+
+def convert_series_to_custom_enum(series:Series, enum, none_value) -> Series:
+	"""
+	The vectorized version of convert_to_custom_enum. Missing values become ``none_value`` and values that are not a known spelling become None.
+	"""
+	if enum not in ENUM_ALIASES:
+		ENUM_ALIASES[enum] = _build_enum_aliases(enum)
+	members = series.astype("string").str.upper().map(ENUM_ALIASES[enum]).astype(object)
+	members = members.where(members.notna(), None)
+	is_member = series.map(lambda value: isinstance(value, enum), na_action="ignore").fillna(False).astype(bool)
+	return members.where(~is_member, series).where(series.notna(), none_value)
 
 
 def convert_to_gender(value:str) -> Gender:
@@ -221,9 +340,216 @@ def convert_to_population_density(value:str) -> PopulationDensity:
 	raise ValueError(f"Unknown population density value: {value}")
 
 
+FALLBACK_COLUMNS = ("id", "name", "column", "value", "default")
+
+
+def _enum_defaults() -> dict:
+	return {"Gender": (Gender, Gender.U), "Race": (Race, Race.U), "ThreatLevel": (ThreatLevel, ThreatLevel.Undetermined), "Flee": (Flee, Flee.Unknown),
+			"Armed": (Armed, Armed.Unclear), "PopulationDensity": (PopulationDensity, PopulationDensity.Undetermined)}
+
+
+def correct_dataframe_types(df:DataFrame, correct_type_dct:dict[str,type], **kwargs) -> tuple[DataFrame, DataFrame]:
+	"""
+	The columnar version of correct_dictionary_types. Each column is converted in one call instead of one cell at a time.
+	:param DataFrame df: A DataFrame, or a chunk of one, whose columns are the keys of the type map.
+	:param dict correct_type_dct: A dictionary holding the correct type for each column. The column is the key and the type is the value.
+	:return: The converted DataFrame, and a DataFrame with a row for every value that could not be converted and was given a default value instead. Ints and dates that cannot be read are missing, so a date column that is required has to be checked, i.e. with is_complete.
+	"""
+	leave_dates_as_date = kwargs.get("leave_dates_as_date", False)
+	df = df.copy()
+	enums = _enum_defaults()
+	fallbacks = []
+
+	for key, correct_type in correct_type_dct.items():
+		column = df[key]
+		missing = column.isna()
+		if not is_numeric_dtype(column) and not is_datetime64_any_dtype(column):
+			missing |= column.astype(object).eq("")
+		failed = None
+		default = None
+
+		match correct_type.__name__:
+			case "str":
+				df[key] = column.astype(object).where(~missing, None)
+			case "int":
+				if is_numeric_dtype(column):
+					numbers = column.where(~missing).astype("float64")
+				else:  # Only what int() reads, so "3.5" and "3.0" are not ints, like correct_dictionary_types
+					numbers = to_numeric(column.where(~missing & column.astype("string").str.fullmatch(r"\s*[+-]?\d+\s*").fillna(False).astype(bool)), errors="coerce")
+				numbers = numbers.where(numbers == trunc(numbers))
+				failed = numbers.isna() & ~missing
+				df[key] = numbers.astype("Int64")
+			case "float":
+				numbers = to_numeric(column.where(~missing), errors="coerce")
+				failed = numbers.isna() & ~missing
+				df[key] = numbers.astype("float64")
+			case "bool":
+				if is_numeric_dtype(column) or is_bool_dtype(column):
+					df[key] = column.fillna(0).astype(bool)
+				else:
+					df[key] = column.astype("string").str.lower().isin(("true", "yes")).astype(bool)
+			case "date":
+				days = column if is_datetime64_any_dtype(column) else parse_date_column(column.where(~missing))
+				failed = days.isna() & ~missing
+				uniques = DatetimeIndex(days.dropna().unique())  # Each date is only converted once
+				lookup = Series(uniques.date if leave_dates_as_date else uniques.strftime("%Y-%m-%d"), index=uniques, dtype=object)
+				df[key] = days.map(lookup).astype(object).where(days.notna(), None)
+			case name if name in enums:
+				enum, default = enums[name]
+				members = convert_series_to_custom_enum(column.where(~missing), enum, default)
+				failed = members.isna() & ~missing
+				df[key] = members.where(~failed, default)
+
+		if failed is not None and failed.any():
+			fallbacks.append(DataFrame({"id": df.loc[failed, "id"] if "id" in df.columns else None, "name": df.loc[failed, "name"] if "name" in df.columns else None,
+										"column": key, "value": column[failed], "default": default}, columns=FALLBACK_COLUMNS))
+	return df, concat(fallbacks, ignore_index=True) if fallbacks else DataFrame(columns=FALLBACK_COLUMNS)
+
+
+def is_complete(dct:dict, columns) -> bool:
+	"""True if none of the columns of a record, whose types have been corrected, are missing. Use it to check the NOT NULL columns before a record is written."""
+	return not any(check_is_none(dct[column]) for column in columns)
+
+
+def frame_to_records(df:DataFrame) -> list[dict]:
+	"""Turns a converted DataFrame into the list of records that the uploaders use, with None for every missing value."""
+	df = df.astype(object)
+	return df.where(df.notna(), None).to_dict("records")
+
+
 def check_similarity(cursor, new_record:dict, type_map, table_name) -> dict:
 	key_order = new_record.keys()
 	cursor.execute(f"SELECT {','.join(key_order).rstrip(',')} FROM {table_name} WHERE id = {new_record['id']}")
 	original = cursor.fetchone()
 	original = correct_dictionary_types({key: value for key, value in zip(key_order, original)}, type_map, leave_dates_as_date=False)
 	return {key: (original[key], new_record[key]) for key in key_order if original[key] != new_record[key]}
+
+
+def report_update(dct:dict, update_dict:dict, update:bool, changelog=None, table_name:str|None=None):
+	if changelog is not None:
+		changelog.record_update(table_name, dct, update_dict, update)
+		return
+	warn(f"The record with id: '{dct['id']}', currently known as '{update_dict['name'] if 'name' in update_dict.keys() else dct['name']}', needs to, and will{' NOT' if not update else ''} be updated. The values that will be updated are: ")
+	print(tabulate([[key, value[0], value[1]] for key, value in update_dict.items()],  headers=("Column", "Current", "New"), tablefmt="fancy_grid"))
+
+
+def chunked(iterable, size:int):
+	iterator = iter(iterable)
+	while chunk := list(islice(iterator, size)):
+		yield chunk
+
+
+class ChangePlan(object):
+	"""Every write needed to bring a table up to date with a set of records, worked out before anything is written."""
+	def __init__(self):
+		self.inserts = {}
+		self.updates = {}
+		self.unchanged = []
+
+	def __len__(self) -> int:
+		return len(self.inserts) + len(self.updates) + len(self.unchanged)
+
+	def __bool__(self) -> bool:
+		return bool(self.inserts) or bool(self.updates)
+
+	def __str__(self) -> str:
+		return f"{len(self.inserts):,} inserts, {len(self.updates):,} updates, {len(self.unchanged):,} unchanged"
+
+	def add(self, dct:dict, original:dict|None, columns):
+		"""
+		Compares a record against the normalized copy that is already stored and files it as an insert, update, or unchanged
+		:param dict dct: The record, after its types have been corrected.
+		:param dict original: The stored copy of the record, or None if the id is not stored yet.
+		:param columns: The columns that are compared.
+		"""
+		if original is None:
+			self.inserts[dct["id"]] = dct
+			return
+		update_dict = {key: (original[key], dct[key]) for key in columns if original[key] != dct[key]}
+		if update_dict:
+			self.updates[dct["id"]] = (dct, update_dict)
+		else:
+			self.unchanged.append(dct["id"])
+
+
+def write_plan(cursor, plan:ChangePlan, columns, table_name:str, update:bool=True, backend=None, changelog=None) -> dict[str,int]:
+	"""
+	Writes a change plan using one executemany per group of inserts and one multi-row upsert for the updates
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:param changelog: An optional ChangeLog that the changes are recorded in, instead of being printed.
+	:return: The number of records that were inserted, updated, skipped (changed but ``update`` is False), and left unchanged.
+	"""
+	columns = tuple(columns)
+	counts = {"inserted": 0, "updated": 0, "skipped": 0, "unchanged": len(plan.unchanged)}
+
+	inserts = {}
+	for dct in plan.inserts.values():
+		if changelog is not None:
+			changelog.record_insert(table_name, dct)
+		non_null_keys = tuple(key for key in columns if not check_is_none(dct[key]))
+		inserts.setdefault(non_null_keys, []).append(tuple(get_true_value(dct[key]) for key in non_null_keys))
+	for non_null_keys, values in inserts.items():
+		cursor.executemany(f"INSERT INTO {table_name}({','.join(non_null_keys)}) VALUES({generate_placeholders(len(non_null_keys), get_placeholder(backend))})", values)
+		counts["inserted"] += len(values)
+
+	updates = []
+	for dct, update_dict in plan.updates.values():
+		report_update(dct, update_dict, update, changelog, table_name)
+		updates.append(tuple(None if check_is_none(dct[key]) else get_true_value(dct[key]) for key in columns))
+	if not update:
+		counts["skipped"] = len(updates)
+	elif updates:
+		if backend is None:
+			assignments = ','.join(f"{key} = VALUES({key})" for key in columns if key != "id")
+			command = f"INSERT INTO {table_name}({','.join(columns)}) VALUES({generate_placeholders(len(columns))}) ON DUPLICATE KEY UPDATE {assignments}"
+		else:
+			command = backend.upsert_statement(table_name, columns)
+		cursor.executemany(command, updates)
+		counts["updated"] = len(updates)
+	return counts
+
+
+def upsert_records(cursor, records, type_map:dict[str,type], table_name:str, update:bool=True, chunk_size:int=1000, prepare=None, snapshot=None, backend=None, changelog=None, plans:list|None=None) -> dict[str,int]:
+	"""
+	Uploads many records into a table, writing them ``chunk_size`` records at a time instead of one round trip per record and column.
+	:param records: An iterable of dictionaries, in the same format that the single record uploaders take.
+	:param dict type_map: A dictionary holding the correct type for each column. The column is the key and the type is the value.
+	:param str table_name: The fully qualified name of the table, i.e. police_brutality.wapo_fatal_force
+	:param bool update: if the database should update the record if the id is already being used.
+	:param int chunk_size: The number of records that are looked up and written in each round trip.
+	:param prepare: An optional function that is called on each record after its types are corrected, and returns the record.
+	:param snapshot: An optional TableSnapshot of the table. When given, records are compared against it in memory instead of being looked up, and it is kept up to date with what gets written.
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:param changelog: An optional ChangeLog that the changes are recorded in, instead of being printed. It is flushed after every chunk.
+	:param list plans: An optional list that each written plan is appended to instead of being applied to the snapshot, so the caller can apply them once the transaction commits.
+	:return: The number of records that were inserted, updated, skipped (changed but ``update`` is False), and left unchanged.
+	"""
+	columns = tuple(type_map.keys())
+	counts = {"inserted": 0, "updated": 0, "skipped": 0, "unchanged": 0}
+
+	for chunk in chunked(records, chunk_size):
+		chunk = [correct_dictionary_types(dct, type_map) for dct in chunk]
+		if prepare is not None:
+			chunk = [prepare(dct) for dct in chunk]
+
+		if snapshot is not None:
+			plan = snapshot.plan(chunk)
+		else:
+			cursor.execute(f"SELECT {','.join(columns)} FROM {table_name} WHERE id IN ({generate_placeholders(len(chunk), get_placeholder(backend))})", tuple(dct["id"] for dct in chunk))
+			existing = {}
+			for row in cursor.fetchall():
+				original = correct_dictionary_types(dict(zip(columns, row)), type_map, leave_dates_as_date=False)
+				existing[original["id"]] = original
+			plan = ChangePlan()
+			for dct in chunk:
+				plan.add(dct, existing.get(dct["id"]), columns)
+
+		for key, value in write_plan(cursor, plan, columns, table_name, update=update, backend=backend, changelog=changelog).items():
+			counts[key] += value
+		if plans is not None:
+			plans.append(plan)
+		elif snapshot is not None:
+			snapshot.apply(plan, update=update)
+		if changelog is not None:
+			changelog.flush()
+	return counts
@@ -1,15 +1,16 @@
-from tabulate import tabulate
-from tools import Gender, Race, ThreatLevel, Flee, get_true_value, correct_dictionary_types, generate_placeholders, convert_to_boolean, convert_to_gender, convert_to_race, convert_to_threat_level, convert_to_flee, check_similarity
-from warnings import warn
+from tools import get_true_value, correct_dictionary_types, generate_placeholders, get_placeholder, check_similarity, report_update, upsert_records, WAPO_TYPE_MAP
 
 
-def upload_wapo_fatal_force_data(cursor, dct:dict[str,str], type_map:dict[str,type], update:bool=True):
+def upload_wapo_fatal_force_data(cursor, dct:dict[str,str], type_map:dict[str,type], update:bool=True, backend=None, changelog=None):
 	"""
 	Uploads a record into the Washington Post Fatal Force's MySQL database
 	:param dict dct: The dictionary of the record. The key should be the column name, and the value should be a string holding the value. The string must be able to be converted using the convert_to... methods for the custom enumerations
 	:param dict type_map: A dictionary holding the correct type for each column. The column is the key and the type is the value.
 	:param bool update: if the database should update the record if the id is already being used.
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:param changelog: An optional ChangeLog that the changes are recorded in, instead of being printed.
 	"""
+	placeholder = get_placeholder(backend)
 	dct = correct_dictionary_types(dct, type_map)
 
 	# Check if the id is already in the table
@@ -19,12 +20,12 @@ def upload_wapo_fatal_force_data(cursor, dct:dict[str,str], type_map:dict[str,ty
 		if not update_dict:
 			return
 
-		warn(f"The record with id: '{dct['id']}', currently known as '{update_dict['name'] if 'name' in update_dict.keys() else dct['name']}', needs to, and will{' NOT' if not update else ''} be updated. The values that will be updated are: ")
-		print(tabulate([[key, value[0], value[1]] for key, value in update_dict.items()],  headers=("Column", "Current", "New"), tablefmt="fancy_grid"))
+		report_update(dct, update_dict, update, changelog, "police_brutality.wapo_fatal_force")
 		if update:
 			for key, (original, new) in update_dict.items():
-				print(f"UPDATE police_brutality.wapo_fatal_force SET {key} = %s WHERE {key} = %s AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
-				cursor.execute(f"UPDATE police_brutality.wapo_fatal_force SET {key} = %s WHERE {key} = %s AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
+				if changelog is None:
+					print(f"UPDATE police_brutality.wapo_fatal_force SET {key} = {placeholder} WHERE {key} = {placeholder} AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
+				cursor.execute(f"UPDATE police_brutality.wapo_fatal_force SET {key} = {placeholder} WHERE {key} = {placeholder} AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
 	else:
 		non_null_keys = []
 		non_null_values = []
@@ -34,35 +35,92 @@ def upload_wapo_fatal_force_data(cursor, dct:dict[str,str], type_map:dict[str,ty
 				non_null_keys.append(header)
 				non_null_values.append(get_true_value(val))
 
-		command = f"INSERT INTO police_brutality.wapo_fatal_force({','.join(non_null_keys)}) VALUES({generate_placeholders(len(non_null_values))})"
+		command = f"INSERT INTO police_brutality.wapo_fatal_force({','.join(non_null_keys)}) VALUES({generate_placeholders(len(non_null_values), placeholder)})"
 		cursor.execute(command, non_null_values)
+		if changelog is not None:
+			changelog.record_insert("police_brutality.wapo_fatal_force", dct)
+
+
+def upload_wapo_fatal_force_batch(cursor, records, type_map:dict[str,type], update:bool=True, chunk_size:int=1000, snapshot=None, backend=None, changelog=None) -> dict[str,int]:
+	"""
+	Uploads many records into the Washington Post Fatal Force's MySQL database, ``chunk_size`` records per round trip
+	:param records: An iterable of dictionaries, each in the same format as the ``dct`` parameter of upload_wapo_fatal_force_data
+	:param dict type_map: A dictionary holding the correct type for each column. The column is the key and the type is the value.
+	:param bool update: if the database should update the record if the id is already being used.
+	:param int chunk_size: The number of records that are looked up and written in each round trip.
+	:param TableSnapshot snapshot: An optional snapshot of the table to diff the records against instead of looking them up.
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:param changelog: An optional ChangeLog that the changes are recorded in, instead of being printed.
+	:return: The number of records that were inserted, updated, skipped, and left unchanged.
+	"""
+	return upsert_records(cursor, records, type_map, "police_brutality.wapo_fatal_force", update=update, chunk_size=chunk_size, snapshot=snapshot, backend=backend, changelog=changelog)
 
 
 if __name__ == "__main__":
 	from csv import DictReader
-	from datetime import date
 	from mysql.connector import connect
-	from ..tools import get_host_kwargs
+	from ..tools import get_host_kwargs, TransactionManager
+	from changelog import ChangeLog
+	from checkpoint import IngestState, skip_unchanged, stage_written
+	from pipeline import Pipeline, read_csv_chunks, to_records, coerce, diff, write
+	from snapshot import TableSnapshot
 
 	db = connect(**get_host_kwargs())
 	cursor = db.cursor(buffered=True)
 
 	database_file = r"D:\data\SIR\Police\data-police-shootings\fatal-police-shooting-data.csv"
 	has_header_in_file = True
-	type_map = {"id": int, "name": str, "date": date, "manner_of_death": str, "weapon": str, "age": int, "gender": Gender,
-				"race": Race, "city": str, "state": str, "mental_illness_symptoms": bool, "threat_level": ThreatLevel,
-				"fleeing": Flee, "body_camera": bool, "longitude": float, "latitude": float, "exact_geocoding": bool}
+	type_map = WAPO_TYPE_MAP
 	update = True
+	batch_size = 1000  # Set to None to upload one record at a time
+
+	commit_every_rows = 5000
+	commit_every_seconds = 30
+	state_file = r"D:\data\SIR\Police\data-police-shootings\wapo_ingest_state.json"  # Set to None to re-process every row
+	changelog = ChangeLog(r"D:\data\SIR\Police\data-police-shootings\wapo_changes.jsonl")  # Set the file to None to keep the changes in memory only
+
+	if batch_size:
+		table_name = "police_brutality.wapo_fatal_force"
+		state = IngestState(state_file) if state_file else None
+		start = state.offset(table_name) if state else 0
+		if start:
+			print(f"Resuming after row {start:,}")
 
-	with open(database_file, 'r') as csvfile:
-		reader = DictReader(csvfile, type_map.keys(), delimiter=',', quotechar='"')
-		iterator = iter(reader)
-		if has_header_in_file:
-			next(iterator)
-		for row in iterator:
-			print(f"ID: {row['id']:>5} started")
-			upload_wapo_fatal_force_data(cursor, row, type_map, update=update)
-	print("Finished")
-	# if update:
-	# 	input("Ready to commit?")
-	db.commit()
+		def save_state():
+			changelog.flush()
+			if state:
+				state.commit(table_name, start + pipeline.rows)
+
+		transactions = TransactionManager(db, every_rows=commit_every_rows, every_seconds=commit_every_seconds, savepoints=True, on_commit=save_state)
+		snapshot = TableSnapshot.from_cursor(db.cursor(), table_name, type_map)
+		writer = write(cursor, snapshot, update=update, transactions=transactions, changelog=changelog, on_write=stage_written(state, table_name, type_map.keys(), update) if state else None)
+		stages = [to_records(), coerce(type_map)]
+		if state:
+			stages.append(skip_unchanged(state, table_name, type_map.keys()))
+		pipeline = Pipeline(read_csv_chunks(database_file, chunksize=batch_size, names=list(type_map.keys()), header=0 if has_header_in_file else None,
+											skiprows=range(1 if has_header_in_file else 0, start + (1 if has_header_in_file else 0)), dtype=str, keep_default_na=False),
+							*stages, diff(snapshot), writer)
+		for _ in pipeline:
+			changelog.progress(start + pipeline.rows)
+		transactions.finish()
+		if state:
+			state.finish(table_name)
+		changelog.close()
+		print(pipeline.report())
+		if transactions.errors:
+			print(transactions.report())
+		print(f"Finished: {writer.counts}")
+	else:
+		with open(database_file, 'r') as csvfile:
+			reader = DictReader(csvfile, type_map.keys(), delimiter=',', quotechar='"')
+			iterator = iter(reader)
+			if has_header_in_file:
+				next(iterator)
+			for rows, row in enumerate(iterator, 1):
+				upload_wapo_fatal_force_data(cursor, row, type_map, update=update, changelog=changelog)
+				changelog.progress(rows)
+		print("Finished")
+		# if update:
+		# 	input("Ready to commit?")
+		db.commit()
+		changelog.close()
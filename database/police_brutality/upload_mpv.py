@@ -1,19 +1,19 @@
 from mysql.connector.cursor_cext import CMySQLCursorBuffered
-from tabulate import tabulate
-from tools import Armed, Gender, Race, ThreatLevel, Flee, PopulationDensity, get_true_value, correct_dictionary_types, generate_placeholders, check_is_none, check_similarity
+from tools import get_true_value, correct_dictionary_types, generate_placeholders, get_placeholder, check_is_none, check_similarity, report_update, upsert_records, is_complete, MPV_TYPE_MAP, MPV_COLUMNS, MPV_REQUIRED_COLUMNS
 from warnings import warn
 
 
-def upload_mpv_data(cursor:CMySQLCursorBuffered, dct:dict[str,str], type_map:dict[str,type], update:bool=True):
+def upload_mpv_data(cursor:CMySQLCursorBuffered, dct:dict[str,str], type_map:dict[str,type], update:bool=True, backend=None, changelog=None):
 	"""
 	Uploads a record into the Mapping Police Violence database
 	:param dict dct: The dictionary of the record. The key should be the column name, and the value should be a string holding the value. The string must be able to be converted using the convert_to... methods for the custom enumerations
 	:param dict type_map: A dictionary holding the correct type for each column. The column is the key and the type is the value.
 	:param bool update: if the database should update the record if the id is already being used.
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:param changelog: An optional ChangeLog that the changes are recorded in, instead of being printed.
 	"""
+	placeholder = get_placeholder(backend)
 	dct = correct_dictionary_types(dct, type_map)
-	if dct["race"] == Race.UR:
-		dct["race"] = Race.U
 
 	# Check if the id is already in the table
 	cursor.execute(f"SELECT COUNT(id) FROM police_brutality.mapping_police_violence WHERE id = {dct['id']}")
@@ -22,12 +22,12 @@ def upload_mpv_data(cursor:CMySQLCursorBuffered, dct:dict[str,str], type_map:dic
 		if not update_dict:
 			return
 
-		warn(f"The record with id: '{dct['id']}', currently known as '{update_dict['name'] if 'name' in update_dict.keys() else dct['name']}', needs to, and will{' NOT' if not update else ''} be updated. The values that will be updated are: ")
-		print(tabulate([[key, value[0], value[1]] for key, value in update_dict.items()],  headers=("Column", "Current", "New"), tablefmt="fancy_grid"))
+		report_update(dct, update_dict, update, changelog, "police_brutality.mapping_police_violence")
 		if update:
 			for key, (original, new) in update_dict.items():
-				print(f"UPDATE police_brutality.mapping_police_violence SET {key} = %s WHERE {key} = %s AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
-				cursor.execute(f"UPDATE police_brutality.mapping_police_violence SET {key} = %s WHERE {key} = %s AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
+				if changelog is None:
+					print(f"UPDATE police_brutality.mapping_police_violence SET {key} = {placeholder} WHERE {key} = {placeholder} AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
+				cursor.execute(f"UPDATE police_brutality.mapping_police_violence SET {key} = {placeholder} WHERE {key} = {placeholder} AND id = {dct['id']}", (get_true_value(new), get_true_value(original)))
 	else:
 		non_null_keys = []
 		non_null_values = []
@@ -37,55 +37,88 @@ def upload_mpv_data(cursor:CMySQLCursorBuffered, dct:dict[str,str], type_map:dic
 				non_null_keys.append(header)
 				non_null_values.append(get_true_value(val))
 
-		command = f"INSERT INTO police_brutality.mapping_police_violence({','.join(non_null_keys)}) VALUES({generate_placeholders(len(non_null_values))})"
+		command = f"INSERT INTO police_brutality.mapping_police_violence({','.join(non_null_keys)}) VALUES({generate_placeholders(len(non_null_values), placeholder)})"
 		cursor.execute(command, non_null_values)
+		if changelog is not None:
+			changelog.record_insert("police_brutality.mapping_police_violence", dct)
+
+
+def upload_mpv_batch(cursor, records, type_map:dict[str,type], update:bool=True, chunk_size:int=1000, snapshot=None, backend=None, changelog=None) -> dict[str,int]:
+	"""
+	Uploads many records into the Mapping Police Violence database, ``chunk_size`` records per round trip
+	:param records: An iterable of dictionaries, each in the same format as the ``dct`` parameter of upload_mpv_data
+	:param dict type_map: A dictionary holding the correct type for each column. The column is the key and the type is the value.
+	:param bool update: if the database should update the record if the id is already being used.
+	:param int chunk_size: The number of records that are looked up and written in each round trip.
+	:param TableSnapshot snapshot: An optional snapshot of the table to diff the records against instead of looking them up.
+	:param backend: The backend from database.backends that the cursor belongs to. None is the MySQL server.
+	:param changelog: An optional ChangeLog that the changes are recorded in, instead of being printed.
+	:return: The number of records that were inserted, updated, skipped, and left unchanged.
+	"""
+	return upsert_records(cursor, records, type_map, "police_brutality.mapping_police_violence", update=update, chunk_size=chunk_size, snapshot=snapshot, backend=backend, changelog=changelog)
 
 
 if __name__ == "__main__":
-	from datetime import date
 	from mysql.connector import connect
-	from pandas import read_csv
-	from ..tools import get_host_kwargs
-	from mysql.connector.errors import IntegrityError
+	from ..tools import get_host_kwargs, TransactionManager
+	from changelog import ChangeLog
+	from os.path import exists
+	from pandas import concat
+	from pipeline import Pipeline, read_csv_chunks, rename, to_records, validate, coerce_frame, check_foreign_key, diff, write
+	from tabulate import tabulate
+	from snapshot import TableSnapshot, load_ids
 
 	db = connect(**get_host_kwargs())
 	cursor = db.cursor(buffered=True)
 	print(type(cursor))
 	database_file = r"D:\data\SIR\Police\Mapping Police Violence.csv"
-	type_map = {"name":str, "age":int, "gender":Gender, "race":Race,"date":date, "address":str, "city":str, "state":str,
-				"zipcode":int, "county":str, "responsible_agency":str, "ori_agency_identifier":str, "cause_of_death":str,
-				"official_disposition_of_death":str, "mental_illness_symptoms":bool, "armed":Armed, "alleged_weapon":str,
-				"alleged_threat_level":ThreatLevel, "fleeing":Flee, "body_camera":bool, "wapo_id":int, "off_duty_killing":bool,
-				"population_density":PopulationDensity, "id":int, "fatal_encounters_id":int, "encounter_type":str,
-				"call_for_service":bool, "census_tract":int, "census_tract_median_household_income":int, "longitude":float, "latitude":float}
+	type_map = MPV_TYPE_MAP
 	update = False
-	df = read_csv(database_file)
-	df = df.filter(("name", "age", "gender", "race", "date", "street_address", "city", "state", "zip", "county", "agency_responsible",
-					"ori", 'cause_of_death', 'disposition_official', 'signs_of_mental_illness', 'allegedly_armed',
-					'wapo_armed', 'wapo_threat_level', 'wapo_flee', 'wapo_body_camera', 'wapo_id', 'off_duty_killing',
-					'geography', 'mpv_id', 'fe_id', 'encounter_type', 'call_for_service', 'tract', 'hhincome_median_census_tract',
-					'latitude', 'longitude'), axis=1)
-
-	df.columns = type_map.keys()
-	missing_ids = 0
-	for row_index, row in df.iterrows():
-		row_index += 2
-		print(f"Row: {row_index:>6}/10,206 ID: {row['id']:>5} started")
-		dct = row.to_dict()
-		if check_is_none(dct['id']):
-			warn(f"The person in row: {row_index}, named: {dct['name']}, is being skipped because they do not have an MPV ID")
-			missing_ids += 1
-			continue
-		try:
-			upload_mpv_data(cursor, dct, type_map, update=update)
-		except IntegrityError as e:
-			if "Cannot add or update a child row: a foreign key constraint fails" in str(e):
-				print(f"The Washington Post ID for {dct['name']} ({dct['id']}) does not exist in the Washington Post database.")
-
-	print(f"Finished. People missing ids: {missing_ids}")
-	# if update:
-	# 	input("Ready to commit?")
-	db.commit()
+	batch_size = 1000
+	commit_every_rows = 5000
+	commit_every_seconds = 30
+	missing_wapo_policy = "reject"  # "null" uploads the record without its link to the Washington Post database instead
+	reject_file = r"D:\data\SIR\Police\mpv_rejected.csv"
+	changelog = ChangeLog(r"D:\data\SIR\Police\mpv_changes.jsonl")  # Set the file to None to keep the changes in memory only
+	columns = MPV_COLUMNS
+
+	wapo_ids = load_ids(db.cursor(), "police_brutality.wapo_fatal_force")  # Or the ids() of the snapshot from the Washington Post load
+	incomplete = []
+	missing_wapo_ids = 0
+	fallbacks = []
+
+	def is_writable(dct:dict) -> bool:
+		"""A record without an MPV ID, or whose date could not be read, would fail its NOT NULL column and roll back its whole batch"""
+		return is_complete(dct, MPV_REQUIRED_COLUMNS)
+
+	def reject_missing_wapo_ids(rows):
+		global missing_wapo_ids
+		missing_wapo_ids += len(rows)
+		rows.to_csv(reject_file, mode='a', header=not exists(reject_file), index=False)
+
+	snapshot = TableSnapshot.from_cursor(db.cursor(), "police_brutality.mapping_police_violence", type_map)
+	transactions = TransactionManager(db, every_rows=commit_every_rows, every_seconds=commit_every_seconds, savepoints=True, on_commit=changelog.flush)
+	writer = write(cursor, snapshot, update=update, transactions=transactions, changelog=changelog)
+	pipeline = Pipeline(read_csv_chunks(database_file, chunksize=batch_size), rename(columns),
+						coerce_frame(type_map, on_fallback=fallbacks.append),
+						check_foreign_key("wapo_id", wapo_ids, policy=missing_wapo_policy, on_reject=reject_missing_wapo_ids),
+						to_records(fill_none=True), validate(is_writable, on_reject=incomplete.append), diff(snapshot), writer)
+	for _ in pipeline:
+		changelog.progress(pipeline.rows)
+	transactions.finish()
+	changelog.close()
+
+	if fallbacks:
+		warn(f"These values could not be converted and were given a default value:\n{tabulate(concat(fallbacks), headers='keys', showindex=False)}")
+	for dct in incomplete:
+		warn(f"The person named: {dct['name']}, is being skipped because their {' and '.join(column for column in MPV_REQUIRED_COLUMNS if check_is_none(dct[column]))} is missing or could not be read")
+	if missing_wapo_ids:
+		print(f"{missing_wapo_ids:,} records have a Washington Post ID that does not exist in the Washington Post database. They were written to {reject_file}"
+			  f"{'' if missing_wapo_policy == 'reject' else ' and uploaded without it'}.")
+	print(pipeline.report())
+	if transactions.errors:
+		print(transactions.report())
+	print(f"Finished: {writer.counts}. People skipped: {len(incomplete)}")
 
 
 #  TODO: Off Duty isn't saved as a boolean, the column will say "Off-Duty", create an enum to rectify is
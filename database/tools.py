@@ -1,3 +1,8 @@
+from contextlib import contextmanager
+from tabulate import tabulate
+from time import perf_counter
+
+
 def get_host_kwargs(host=None, user=None, password=None, database=None, port="3306") -> dict[str,str]:
 	from os import getenv
 	return {"host": getenv("host", host),
@@ -7,5 +12,110 @@ def get_host_kwargs(host=None, user=None, password=None, database=None, port="33
 			"port":getenv("port", port)}
 
 
+def get_pool_kwargs(pool_name:str="sir", pool_size:int=4, **kwargs) -> dict:
+	"""The keyword arguments for a mysql.connector connection pool. The other keyword arguments are passed on to get_host_kwargs"""
+	return {"pool_name": pool_name, "pool_size": pool_size, **get_host_kwargs(**kwargs)}
+
+
 def generate_placeholders(number:int) -> str:
 	return ("%s," * number).rstrip(",")
+
+
+class TransactionManager(object):
+	"""
+	Decides when a loader's connection commits. Work is done in batches, and the open transaction is committed once it holds ``every_rows`` rows or has been open for ``every_seconds`` seconds.
+	With savepoints, a batch that raises is rolled back on its own and the load carries on. Without them, the whole open transaction is rolled back.
+	"""
+	def __init__(self, db, every_rows:int|None=None, every_seconds:float|None=None, savepoints:bool=False, on_commit=None, on_rollback=None):
+		"""
+		:param db: The connection, from mysql.connector or one of the backends in database.backends.
+		:param int every_rows: Commit once this many rows are waiting to be committed. None only commits at the end, unless every_seconds is set.
+		:param float every_seconds: Commit once the transaction has been open this long.
+		:param bool savepoints: Start each batch with a savepoint, so that an error only rolls back that batch.
+		:param on_commit: An optional function that is called with no arguments after each commit.
+		:param on_rollback: An optional function that is called with the batch's result after a batch is rolled back.
+		"""
+		self.db = db
+		self.every_rows = every_rows
+		self.every_seconds = every_seconds
+		self.savepoints = savepoints
+		self.on_commit = on_commit
+		self.on_rollback = on_rollback
+		self.results = []
+		self._pending = []
+		self._pending_rows = 0
+		self._opened = None
+
+	def __str__(self) -> str:
+		statuses = [result["status"] for result in self.results]
+		return f"{len(self.results):,} batches: {statuses.count('committed'):,} committed, {statuses.count('rolled back'):,} rolled back, {statuses.count('pending'):,} pending"
+
+	@property
+	def errors(self) -> list[dict]:
+		return [result for result in self.results if result["error"] is not None]
+
+	@contextmanager
+	def batch(self, rows:int=0):
+		"""
+		Runs the body of the with statement as one batch of ``rows`` rows. An exception inside the body is rolled back and recorded in the batch's result instead of being raised.
+		:return: The batch's result: its number, rows, seconds, status (pending, committed, or rolled back), and error.
+		"""
+		result = {"batch": len(self.results) + 1, "rows": rows, "seconds": 0.0, "status": "pending", "error": None}
+		self.results.append(result)
+		cursor = self.db.cursor()
+		if self._opened is None:
+			self._opened = perf_counter()
+		if self.savepoints:
+			if not getattr(self.db, "in_transaction", True):
+				cursor.execute("BEGIN")  # Without an open transaction, releasing the savepoint would commit it
+			cursor.execute(f"SAVEPOINT batch_{result['batch']}")
+
+		start = perf_counter()
+		try:
+			yield result
+		except Exception as e:
+			result["error"] = repr(e)
+			if self.savepoints:
+				cursor.execute(f"ROLLBACK TO SAVEPOINT batch_{result['batch']}")
+				rolled_back = [result]
+			else:
+				self.db.rollback()
+				rolled_back = self._pending + [result]
+				self._pending = []
+				self._pending_rows = 0
+				self._opened = None
+			for rolled_back_result in rolled_back:
+				rolled_back_result["status"] = "rolled back"
+				if self.on_rollback is not None:
+					self.on_rollback(rolled_back_result)
+		else:
+			if self.savepoints:
+				cursor.execute(f"RELEASE SAVEPOINT batch_{result['batch']}")
+			self._pending.append(result)
+			self._pending_rows += rows
+		finally:
+			result["seconds"] = perf_counter() - start
+
+		# A batch that was rolled back never commits, so the caller can undo its own bookkeeping before the next commit runs on_commit
+		if result["error"] is None and self._pending and ((self.every_rows is not None and self._pending_rows >= self.every_rows) or
+							  (self.every_seconds is not None and perf_counter() - self._opened >= self.every_seconds)):
+			self.commit()
+
+	def commit(self):
+		self.db.commit()
+		for result in self._pending:
+			result["status"] = "committed"
+		self._pending = []
+		self._pending_rows = 0
+		self._opened = None
+		if self.on_commit is not None:
+			self.on_commit()
+
+	def finish(self):
+		"""Commits whatever is still waiting to be committed"""
+		self.commit()
+		return self
+
+	def report(self) -> str:
+		return tabulate([[result["batch"], result["rows"], result["seconds"], result["status"], result["error"] or ""] for result in self.results],
+						headers=("Batch", "Rows", "Seconds", "Status", "Error"), floatfmt=".3f")
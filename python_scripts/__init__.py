@@ -1,7 +1,12 @@
-from .converter import Converter
+from .cache import TableCache
+from .converter import Converter, ConversionPlan
+from .fetch import Fetcher
+from .packed import PackedDataset
+from .indexes import Bitmap, ShootingsIndex
 from .inmates import Inmates
 from .population import CountyPopulation, StatePopulation, get_tables_from_web, add_state_graduation_rates, states_to_csv, states_to_xlsx
-from .shootings import Shootings
+from .shootings import Shootings, ShootingsTable, ShootingView, binary_schema, read_binary_csv, iter_binary_csv
+from .spatial import SpatialIndex
 from .tools import data_dir, add_data_dir, remove_data_dir
 from .__main__ import graduation_rate
 from .causes import Causes
\ No newline at end of file
@@ -0,0 +1,125 @@
+__author__ = "Len Washington III"
+
+from hashlib import sha256
+from json import dump, load
+from os import listdir, makedirs, remove, replace
+from os.path import exists, join
+from pickle import HIGHEST_PROTOCOL, dump as pickle_dump, load as pickle_load
+from time import time
+from requests import get
+try:
+    from fetch import parse_tables
+    from tools import add_data_dir
+except ModuleNotFoundError:
+    from .fetch import parse_tables
+    from .tools import add_data_dir
+
+
+class TableCache(object):
+    """
+    Keeps the pages that get_tables_from_web downloads on disk, keyed by url: the raw body, a .json with its fetch time and validators, and the parsed tables pickled, so a page that is cached is neither downloaded nor parsed again.
+    A page older than the ttl is revalidated with If-None-Match and If-Modified-Since, so a page that has not changed costs a 304 and no parse.
+    """
+    def __init__(self, directory: str = None, ttl: float | None = 7 * 24 * 60 * 60, offline: bool = False, timeout: float = 30):
+        """
+        :param str directory: The folder the cache is kept in. Defaults to web_cache in the data directory.
+        :param float ttl: The number of seconds a page is used without asking the server again. None never asks again, and 0 always does.
+        :param bool offline: Only serve pages from the cache, however old, and raise LookupError for a page that is not cached.
+        :param float timeout: The timeout of a request that is not sent through a Fetcher.
+        """
+        self.directory = add_data_dir("web_cache") if directory is None else directory
+        self.ttl = ttl
+        self.offline = offline
+        self.timeout = timeout
+        makedirs(self.directory, exist_ok=True)
+
+    def __contains__(self, url: str) -> bool:
+        return exists(self._path(url, ".json"))
+
+    def __len__(self) -> int:
+        return sum(1 for file in listdir(self.directory) if file.endswith(".json"))
+
+    def __str__(self) -> str:
+        return f"Cache of {len(self):,} pages in {self.directory}{' (offline)' if self.offline else ''}"
+
+    def _path(self, url: str, extension: str) -> str:
+        return join(self.directory, sha256(url.encode()).hexdigest()[:32] + extension)
+
+    @staticmethod
+    def _write(path: str, write, mode: str = 'w'):
+        """Writes a file through a temporary file, so a reader never sees half of it"""
+        with open(f"{path}.part", mode) as file:
+            write(file)
+        replace(f"{path}.part", path)
+
+    def entry(self, url: str) -> dict | None:
+        """The url's fetch time, ETag, and Last-Modified, or None if it is not cached"""
+        try:
+            with open(self._path(url, ".json")) as file:
+                return load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict | None) -> bool:
+        return entry is not None and (self.ttl is None or time() - entry["fetched_at"] < self.ttl)
+
+    def _cached_tables(self, url: str) -> list:
+        """The pickled tables, parsed again from the raw body if the pickle is missing or cannot be read"""
+        try:
+            with open(self._path(url, ".pkl"), 'rb') as file:
+                return pickle_load(file)
+        except (FileNotFoundError, EOFError, ValueError, AttributeError, ImportError):
+            with open(self._path(url, ".html"), 'rb') as file:
+                tables = parse_tables(file.read())
+            self._write(self._path(url, ".pkl"), lambda output: pickle_dump(tables, output, protocol=HIGHEST_PROTOCOL), 'wb')
+            return tables
+
+    def _store(self, url: str, response) -> list:
+        content = response.content
+        tables = parse_tables(content)
+        self._write(self._path(url, ".html"), lambda output: output.write(content), 'wb')
+        self._write(self._path(url, ".pkl"), lambda output: pickle_dump(tables, output, protocol=HIGHEST_PROTOCOL), 'wb')
+        self._touch(url, {"url": url, "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"), "status": response.status_code})
+        return tables
+
+    def _touch(self, url: str, entry: dict):
+        entry["fetched_at"] = time()
+        self._write(self._path(url, ".json"), lambda output: dump(entry, output))
+
+    def tables(self, url: str, fetcher=None) -> list:
+        """
+        Every table of a page as a DataFrame
+        :param fetcher: An optional Fetcher that the page is requested through, with its session, rate limit, and retries.
+        """
+        entry = self.entry(url)
+        if self.offline or self.is_fresh(entry):
+            if entry is None:
+                raise LookupError(f"{url} is not in the cache, and the cache is offline")
+            return self._cached_tables(url)
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        if fetcher is not None:
+            response = fetcher.response(url, headers=headers)
+        else:
+            response = get(url, headers=headers, timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        if response.status_code == 304 and entry is not None:
+            self._touch(url, entry)
+            return self._cached_tables(url)
+        return self._store(url, response)
+
+    def invalidate(self, url: str = None):
+        """Removes a page from the cache, or every page if no url is given"""
+        if url is None:
+            files = [join(self.directory, file) for file in listdir(self.directory) if file.endswith((".json", ".html", ".pkl"))]
+        else:
+            files = [self._path(url, extension) for extension in (".json", ".html", ".pkl")]
+        for file in files:
+            if exists(file):
+                remove(file)
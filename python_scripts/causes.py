@@ -1,5 +1,8 @@
 import pandas as pd
-from tools import add_data_dir
+try:
+    from tools import add_data_dir
+except ModuleNotFoundError:
+    from .tools import add_data_dir
 
 
 class Causes(object):
@@ -1,11 +1,80 @@
 __author__ = "Len Washington III"
 
+from numpy import array, concatenate, float64, int16, int32, int64, isnan, uint8
+from pandas import factorize, read_csv, to_datetime, to_numeric
 try:
+    from packed import write_packed
     from tools import add_data_dir
 except ModuleNotFoundError:
+    from .packed import write_packed
     from .tools import add_data_dir
 
 
+class ConversionPlan(object):
+    """
+    Conversion headers compiled once into a function per input column, so a cell is converted with one lookup instead of re-reading the headers.
+    An empty conversion copies the cell, a conversion holding "False" and "True" is a single boolean cell, and anything else is one "1"/"0" cell per value, found with a dictionary.
+    """
+    COPY, BOOLEAN, ONE_HOT = "copy", "boolean", "one hot"
+    _ONE, _ZERO = ("1",), ("0",)
+
+    def __init__(self, conversion_headers: tuple):
+        """
+        :param tuple conversion_headers: A conversion for each input column, like Converter.STANDARD_CONVERSION_HEADERS. A value that is a tuple sets its output cell for any of its members.
+        """
+        self.conversion_headers = conversion_headers
+        self.kinds = []
+        self.functions = []
+        self.positions = []  # Where each input column's cells start in an output row
+        self.width = 0
+        for conversion in conversion_headers:
+            self.positions.append(self.width)
+            if len(conversion) == 0:
+                self.kinds.append(self.COPY)
+                self.functions.append(self._copy)
+                self.width += 1
+            elif "False" in conversion and "True" in conversion:
+                self.kinds.append(self.BOOLEAN)
+                self.functions.append(self._boolean)
+                self.width += 1
+            else:
+                self.kinds.append(self.ONE_HOT)
+                self.functions.append(self._one_hot(conversion))
+                self.width += len(conversion)
+
+    def __len__(self) -> int:
+        return len(self.functions)
+
+    def __str__(self) -> str:
+        return f"Conversion plan for {len(self)} input columns into {self.width} output columns"
+
+    @staticmethod
+    def _copy(cell: str) -> tuple:
+        return cell,
+
+    @classmethod
+    def _boolean(cls, cell: str) -> tuple:
+        return cls._ONE if "True" in cell else cls._ZERO
+
+    @staticmethod
+    def _one_hot(conversion: tuple):
+        members = [frozenset(value) if isinstance(value, tuple) else frozenset((value,)) for value in conversion]
+        lookup = {cell: tuple("1" if cell in member else "0" for member in members) for cell in frozenset().union(*members)}
+        default = ("0",) * len(conversion)
+        return lambda cell: lookup.get(cell, default)
+
+    def convert(self, index: int, cell: str) -> tuple:
+        """The output cells of one cleaned cell of an input column"""
+        return self.functions[index](cell)
+
+    def convert_row(self, row) -> list:
+        """The output cells of a row of cleaned cells. Like zip, a row with fewer cells than the plan has columns stops at its last cell."""
+        output = []
+        for function, cell in zip(self.functions, row):
+            output += function(cell)
+        return output
+
+
 class Converter(object):
     STANDARD_INPUT_HEADERS = ("id", "name", "date", "manner_of_death", "armed", "age", "gender", "race", "city", "state", "signs_of_mental_illness", "threat_level", "flee", "body_camera", "longitude", "latitude", "is_geocoding_exact")
     STANDARD_OUTPUT_HEADERS = (("Id"), ("Name"), ("Date"), ("Shot", "Shot_and_Tasered"), ("Arm_Undetermined", "Arm_Unknown", "Unarmed"), ("Age"),
@@ -17,6 +86,9 @@ class Converter(object):
          ("M", "F", ("None", "")), ("W", "B", "A", "N", "H", "O", ("None", "")),
          (), (), ("False", "True"), ("Attack", "Other", "Undetermined"), ("Foot", "Car", "Not Fleeing"),
          ("False", "True"), (), (), ("False", "True"))
+    STANDARD_PACKED_TYPES = {"id": int64, "date": "datetime64[D]", "age": int16, "longitude": float64, "latitude": float64}  # The copied columns that are not listed are saved as strings
+    PLANS = {}
+    _compiled = {}
 
     def __init__(self, input_file: str, output_file: str, input_headers=(), output_headers=(), conversion_headers=(), insertion="/&*"):
         """
@@ -33,6 +105,9 @@ class Converter(object):
         self.input_headers = input_headers
         self.output_headers = output_headers
         self.conversion_headers = conversion_headers
+        self.plan = None
+        if conversion_headers:
+            self.setConversionHeaders(conversion_headers)
         self.insertion = insertion
         self._index = 0
         self.lis = []
@@ -74,10 +149,34 @@ class Converter(object):
     def setInputHeaders(self, headers: tuple):
         self.input_headers = headers
 
-    def setConversionHeaders(self, headers:tuple):
-        self.conversion_headers = headers
+    def setConversionHeaders(self, headers):
+        """
+        :param headers: The conversion headers, the name of a plan added with register_plan, or a ConversionPlan. Headers are compiled once and reused by every converter that is given the same headers.
+        """
+        if isinstance(headers, str):
+            self.plan = Converter.PLANS[headers]
+        elif isinstance(headers, ConversionPlan):
+            self.plan = headers
+        else:
+            if headers not in Converter._compiled:
+                Converter._compiled[headers] = ConversionPlan(headers)
+            self.plan = Converter._compiled[headers]
+        self.conversion_headers = self.plan.conversion_headers
 
-    def convert_binary(self):
+    @classmethod
+    def register_plan(cls, name: str, conversion_headers: tuple) -> ConversionPlan:
+        """Compiles conversion headers and saves the plan under a name that setConversionHeaders accepts"""
+        cls.PLANS[name] = ConversionPlan(conversion_headers)
+        cls._compiled[conversion_headers] = cls.PLANS[name]
+        return cls.PLANS[name]
+
+    def convert_binary(self, stream=False, chunksize=10_000):
+        """
+        :param bool stream: Read the input with a CSV parser ``chunksize`` rows at a time instead of holding every line, see convert_binary_stream
+        :param int chunksize: The number of rows that are converted at once when streaming
+        """
+        if stream:
+            return self.convert_binary_stream(chunksize)
         lis = open(self.input_file).readlines()
         text = ""
         for item in self.output_headers:
@@ -91,21 +190,101 @@ class Converter(object):
             # Took out `.replace(", ", self.insertion)` because it was screwing up when there was a comma in Junior
             row = row.replace(", Jr.", " Jr.").replace("  ", " ").split(",")  # There's a typo in the name for 820 Austin where there is a space before his name and the system autocorrects that assuming it's something like Junior. I could contact WP to have them change this is their file
             row = [i.strip().lstrip(' ').title() for i in row]
-            app = []
-            for (cell, inp, conv) in zip(row, self.input_headers, self.conversion_headers):
-                if len(conv) == 0:
-                    app.append(cell)
-                elif "False" in conv and "True" in conv:
-                    app.append("1" if "True" in cell else "0")
-                else:
-                    for i in conv:
-                        if isinstance(i, tuple):
-                            app.append("1" if cell in i else "0")
-                        else:
-                            app.append("1" if cell == i else "0")
+            app = self.plan.convert_row(row[:len(self.input_headers)])
             output.writelines(", ".join(app).rstrip(", ").replace(self.insertion, ", ") + "\n")
         self.lis = lis
 
+    def convert_binary_stream(self, chunksize=10_000, buffering=1 << 20) -> int:
+        """
+        Writes the same file as convert_binary, but reads the input with a real CSV parser, so quoted commas stay in their cell, and holds only one chunk at a time.
+        Each column is factorized, its unique values are cleaned and compared against the conversion headers once, and the cells are filled in from the codes.
+        Commas in the cells that are copied as they are, like "Smith, Jr.", are replaced with spaces so that the ", " separated output can still be split.
+        :param int chunksize: The number of rows that are converted at once
+        :param int buffering: The size of the output file's buffer in bytes
+        :return: The number of rows that were converted. self.lis is left empty, since the rows are not kept.
+        """
+        rows = 0
+        with open(self.output_file, 'w', buffering=buffering) as output:
+            output.write(self.write_headers())
+            reader = read_csv(self.input_file, chunksize=chunksize, header=None, skiprows=1, names=list(self.input_headers),
+                              usecols=range(len(self.input_headers)), dtype=object, keep_default_na=False, skip_blank_lines=True)
+            with reader:
+                for chunk in reader:
+                    cells = []
+                    for index, header in enumerate(self.input_headers[:len(self.plan)]):
+                        cells += self._encode_column(chunk[header], index)
+                    text = "\n".join([", ".join(row).rstrip(", ") for row in zip(*cells)]) + "\n"
+                    output.write(text.replace(self.insertion, ", ") if self.insertion in text else text)
+                    rows += len(chunk)
+        self.lis = []
+        return rows
+
+    def convert_packed(self, directory: str, chunksize=10_000, types=None) -> int:
+        """
+        Saves the conversion as a folder of NumPy files, which PackedDataset memory maps, instead of a text file of "1"/"0" cells that has to be parsed again on every load.
+        The indicator columns are bit packed, the columns in ``types`` are typed arrays, and the other copied columns are codes into a table of their unique strings.
+        :param str directory: The folder that the files are saved in
+        :param int chunksize: The number of rows that are read at once
+        :param dict types: {input header: numpy dtype} of the copied columns that are not strings. Defaults to STANDARD_PACKED_TYPES. Missing integers are saved as -1, missing floats as NaN, and missing dates as NaT.
+        :return: The number of rows that were converted
+        """
+        types = Converter.STANDARD_PACKED_TYPES if types is None else types
+        names = self.output_names()
+        indicators, copies = {}, {}
+        rows = 0
+        reader = read_csv(self.input_file, chunksize=chunksize, header=None, skiprows=1, names=list(self.input_headers),
+                          usecols=range(len(self.input_headers)), dtype=object, keep_default_na=False, skip_blank_lines=True)
+        with reader:
+            for chunk in reader:
+                for index, header in enumerate(self.input_headers[:len(self.plan)]):
+                    if self.plan.kinds[index] == ConversionPlan.COPY:
+                        codes, uniques = self._clean_column(chunk[header])
+                        copies.setdefault(names[index][0], []).append(array(uniques, dtype=object)[codes])
+                        continue
+                    for name, cells in zip(names[index], self._encode_column(chunk[header], index)):
+                        indicators.setdefault(name, []).append((cells == "1").astype(uint8))
+                rows += len(chunk)
+
+        columns, strings, missing = {}, {}, {}
+        for index, header in enumerate(self.input_headers[:len(self.plan)]):
+            if self.plan.kinds[index] != ConversionPlan.COPY:
+                continue
+            name = names[index][0]
+            values = concatenate(copies[name]) if copies.get(name) else array([], dtype=object)
+            if header not in types:
+                codes, uniques = factorize(values, use_na_sentinel=False)
+                strings[name] = (codes.astype(int32), array(uniques.tolist(), dtype=str))
+            elif str(types[header]).startswith("datetime64"):
+                columns[name] = to_datetime(values, format="%Y-%m-%d", errors="coerce").to_numpy().astype(types[header])
+            elif array([], dtype=types[header]).dtype.kind in "iu":
+                numbers = array(to_numeric(values, errors="coerce"), dtype=float64)
+                numbers[isnan(numbers)] = -1
+                columns[name] = numbers.astype(types[header])
+                missing[name] = -1
+            else:
+                columns[name] = array(to_numeric(values, errors="coerce"), dtype=types[header])
+        write_packed(directory, rows, [name for group in names for name in group],
+                     {name: concatenate(cells) for name, cells in indicators.items()}, columns, strings, missing)
+        return rows
+
+    def output_names(self) -> list:
+        """The output column names of each input column, as lists, flattened the same way as write_headers"""
+        return [[headers] if isinstance(headers, str) else [name for name in headers if isinstance(name, str)] for headers in self.output_headers]
+
+    @staticmethod
+    def _clean_column(column) -> tuple:
+        """The codes of a column and its cleaned unique values"""
+        codes, uniques = factorize(column.to_numpy(dtype=object), use_na_sentinel=False)
+        return codes, [str(value).replace("  ", " ").strip().title() for value in uniques.tolist()]
+
+    def _encode_column(self, column, index: int) -> list:
+        """The output cells of one input column. The plan converts each unique value once, and the cells are filled in from the codes."""
+        codes, uniques = self._clean_column(column)
+        if self.plan.kinds[index] == ConversionPlan.COPY:
+            return [array([value.replace(", ", " ").replace(",", " ") for value in uniques], dtype=object)[codes]]
+        converted = [self.plan.convert(index, value) for value in uniques]
+        return [array([cells[position] for cells in converted], dtype=object)[codes] for position in range(len(converted[0]))] if converted else []
+
     def write_headers(self) -> str:
         string = ""
         for i in self.output_headers:
@@ -118,11 +297,14 @@ class Converter(object):
         return string.rstrip(", ") + "\n"
 
 
+Converter.register_plan("standard", Converter.STANDARD_CONVERSION_HEADERS)
+
+
 if __name__ == "__main__":
     convert = Converter(add_data_dir("data-police-shootings/fatal-police-shooting-data.csv"), add_data_dir("data-police-shootings/binary-data.csv"))
     convert.setInputHeaders(Converter.STANDARD_INPUT_HEADERS)
     convert.setOutputHeaders(Converter.STANDARD_OUTPUT_HEADERS)
-    convert.setConversionHeaders(Converter.STANDARD_CONVERSION_HEADERS)
+    convert.setConversionHeaders("standard")
 
     for (inp, output, conv) in zip(convert.input_headers, convert.output_headers, convert.conversion_headers):
         print(f"{inp} : {output} : {conv}")
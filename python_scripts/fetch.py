@@ -0,0 +1,141 @@
+__author__ = "Len Washington III"
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlparse
+from pandas import read_html
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter
+
+
+def parse_tables(content: bytes) -> list:
+    """Every table of an HTML page as a DataFrame"""
+    return read_html(BytesIO(content))
+
+
+class RateLimiter(object):
+    """Spaces out the requests to each host, so that no host gets more than ``requests_per_second``, however many threads are fetching"""
+    def __init__(self, requests_per_second: float = 4.0):
+        self.interval = 0.0 if not requests_per_second else 1 / requests_per_second
+        self._lock = Lock()
+        self._next = {}  # host: the earliest time the next request may start
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.interval
+        if start > now:
+            sleep(start - now)
+
+
+class Fetcher(object):
+    """
+    Fetches many pages at once with a pool of threads that share one requests.Session, so connections are kept alive, and parses them in the same threads.
+    Each host is rate limited, and a request that fails, or is answered with one of RETRY_STATUSES, is retried with exponential backoff.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_workers: int = 8, requests_per_second: float = 4.0, retries: int = 3, backoff: float = 0.5, timeout: float = 30, session: Session = None, cache=None):
+        """
+        :param int max_workers: The number of pages that are fetched at once.
+        :param float requests_per_second: The most requests that are sent to one host each second. 0 turns the limit off.
+        :param int retries: The number of times a request is tried again before its error is raised.
+        :param float backoff: The wait before the first retry, in seconds. It doubles with each retry, unless the server sends Retry-After.
+        :param float timeout: The timeout of each request, in seconds.
+        :param requests.Session session: The session to share. A new one is made with a connection pool as big as max_workers.
+        :param cache: An optional TableCache that tables() reads from and fills.
+        """
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = RateLimiter(requests_per_second)
+        self.cache = cache
+        if session is None:
+            session = Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _retry_after(self, response, attempt: int) -> float:
+        retry_after = None if response is None else response.headers.get("Retry-After")
+        if retry_after is not None and retry_after.strip().isdigit():
+            return float(retry_after)
+        return self.backoff * 2 ** attempt
+
+    def response(self, url: str, headers: dict = None):
+        """
+        The response for a page, after waiting for the host's rate limit and retrying failed requests
+        :param dict headers: Extra request headers, i.e. If-None-Match for a conditional request, which can be answered with 304.
+        """
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(url)
+            response = None
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in Fetcher.RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                if attempt == self.retries:
+                    response.raise_for_status()
+            except RequestException:
+                if attempt == self.retries or (response is not None and response.status_code not in Fetcher.RETRY_STATUSES):
+                    raise
+            sleep(self._retry_after(response, attempt))
+
+    def get(self, url: str) -> bytes:
+        """The body of a page"""
+        return self.response(url).content
+
+    def tables(self, url: str) -> list:
+        """Every table of a page as a DataFrame, from the Fetcher's cache if it has one"""
+        if self.cache is not None:
+            return self.cache.tables(url, fetcher=self)
+        return parse_tables(self.get(url))
+
+    def map(self, function, urls) -> dict:
+        """
+        Calls a function with each url in the thread pool
+        :return: {url: the function's result, or the exception that it raised}, in the order of the urls
+        """
+        urls = list(dict.fromkeys(urls))
+        results = {}
+
+        def call(url):
+            try:
+                return function(url)
+            except Exception as e:
+                return e
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for url, result in zip(urls, pool.map(call, urls)):
+                results[url] = result
+        return results
+
+    def fetch_tables(self, urls, errors: str = "raise") -> dict:
+        """
+        The tables of many pages, fetched and parsed at once
+        :param str errors: "raise" raises the first error once every page is done, and "skip" leaves the pages that failed out.
+        :return: {url: list of DataFrames}
+        """
+        if errors not in ("raise", "skip"):
+            raise ValueError(f"errors must be raise or skip, not {errors}")
+        results = self.map(self.tables, urls)
+        failed = {url: result for url, result in results.items() if isinstance(result, Exception)}
+        if failed and errors == "raise":
+            url, error = next(iter(failed.items()))
+            raise RuntimeError(f"{len(failed):,} of {len(results):,} pages could not be fetched, the first was {url}") from error
+        return {url: result for url, result in results.items() if url not in failed}
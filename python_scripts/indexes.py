@@ -0,0 +1,171 @@
+__author__ = "Len Washington III"
+
+import numpy as np
+import pandas as pd
+
+
+_POPULATION = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)  # The number of set bits in each byte
+
+
+class Bitmap(object):
+    """A set of row positions held as one bit per row, packed 8 rows to a byte, so sets are combined a byte at a time with &, |, ~, and -"""
+    __slots__ = ("bits", "rows")
+
+    def __init__(self, bits: np.ndarray, rows: int):
+        """
+        :param numpy.ndarray bits: The packed bits, from np.packbits. The bits past the last row are 0.
+        :param int rows: The number of rows the bitmap covers.
+        """
+        self.bits = bits
+        self.rows = rows
+
+    @staticmethod
+    def from_mask(mask) -> "Bitmap":
+        mask = np.asarray(mask, dtype=bool)
+        return Bitmap(np.packbits(mask), len(mask))
+
+    @staticmethod
+    def empty(rows: int) -> "Bitmap":
+        return Bitmap(np.zeros((rows + 7) // 8, dtype=np.uint8), rows)
+
+    @staticmethod
+    def full(rows: int) -> "Bitmap":
+        return ~Bitmap.empty(rows)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __str__(self) -> str:
+        return f"Bitmap of {self.count():,} out of {self.rows:,} rows"
+
+    def _check(self, other: "Bitmap"):
+        if self.rows != other.rows:
+            raise ValueError(f"A bitmap of {self.rows:,} rows cannot be combined with one of {other.rows:,} rows")
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        self._check(other)
+        return Bitmap(self.bits & other.bits, self.rows)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        self._check(other)
+        return Bitmap(self.bits | other.bits, self.rows)
+
+    def __xor__(self, other: "Bitmap") -> "Bitmap":
+        self._check(other)
+        return Bitmap(self.bits ^ other.bits, self.rows)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        """The rows of this bitmap that are not in the other, i.e. a & ~b"""
+        self._check(other)
+        return Bitmap(self.bits & ~other.bits, self.rows)
+
+    def __invert__(self) -> "Bitmap":
+        bits = ~self.bits
+        if self.rows % 8:  # Clear the padding bits, so they are never counted
+            bits[-1] &= np.uint8((0xFF << (8 - self.rows % 8)) & 0xFF)
+        return Bitmap(bits, self.rows)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Bitmap) and self.rows == other.rows and np.array_equal(self.bits, other.bits)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        """The bitmap as a boolean mask, so table[bitmap] works like table[mask]"""
+        mask = self.mask()
+        return mask if dtype is None else mask.astype(dtype)
+
+    def count(self) -> int:
+        """The number of rows in the bitmap, counted from the packed bytes without unpacking them"""
+        return int(_POPULATION[self.bits].sum(dtype=np.int64))
+
+    def mask(self) -> np.ndarray:
+        return np.unpackbits(self.bits, count=self.rows).astype(bool)
+
+    def positions(self) -> np.ndarray:
+        """The positions of the rows in the bitmap, in order"""
+        return np.flatnonzero(np.unpackbits(self.bits, count=self.rows))
+
+
+class ShootingsIndex(object):
+    """
+    A bitmap for every value of the state, year, race, gender, threat level, flee, and age columns of a ShootingsTable, and for every indicator column that it is given.
+    Any combination of values is found with bitwise operations on the bitmaps, instead of a scan over the rows, i.e. index.query(race="Black", gender="Male") & index.between("age", 13, 19)
+    """
+    COLUMNS = ("state", "year", "race", "gender", "threat_level", "flee", "age")
+    FLAGS = ("shot", "shot_and_tasered", "arm_undetermined", "arm_unknown", "unarmed", "signs_of_mental_illness", "body_camera", "is_geocoding_exact")
+
+    def __init__(self, table, columns=None, flags=None):
+        """
+        :param table: A ShootingsTable, or a DataFrame with its columns.
+        :param tuple columns: The columns that get a bitmap per value. Defaults to COLUMNS, and year is taken from the date column.
+        :param tuple flags: The boolean columns that get a bitmap each. Defaults to FLAGS.
+        """
+        frame = table.frame if hasattr(table, "frame") else table
+        self.rows = len(frame)
+        self.ids = frame["id"].to_numpy() if "id" in frame else None
+        self.bitmaps = {}
+        for column in (ShootingsIndex.COLUMNS if columns is None else columns):
+            series = frame["date"].dt.year if column == "year" and "year" not in frame else frame[column]
+            self.bitmaps[column] = self._value_bitmaps(series)
+        self.flags = {flag: Bitmap.from_mask(frame[flag].fillna(False).to_numpy(dtype=bool)) for flag in (ShootingsIndex.FLAGS if flags is None else flags)}
+
+    def _value_bitmaps(self, series: pd.Series) -> dict:
+        """{value: Bitmap of the rows that hold it}. Missing values are left out. The rows are sorted by value once, so each bitmap is set from one run of positions."""
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        bitmaps = {}
+        for code, value in enumerate(uniques.tolist()):
+            mask = np.zeros(self.rows, dtype=bool)
+            mask[order[bounds[code]:bounds[code + 1]]] = True
+            bitmaps[value] = Bitmap.from_mask(mask)
+        return bitmaps
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __str__(self) -> str:
+        return f"Bitmap index of {self.rows:,} police shootings over {len(self.bitmaps)} columns and {len(self.flags)} flags"
+
+    def values(self, column: str) -> list:
+        """The values of a column that have a bitmap"""
+        return list(self.bitmaps[column])
+
+    def all(self) -> Bitmap:
+        return Bitmap.full(self.rows)
+
+    def get(self, column: str, value) -> Bitmap:
+        """The rows whose column holds the value, or a flag's rows when value is True. A value that never occurs is an empty bitmap."""
+        if column in self.flags:
+            return self.flags[column] if value else ~self.flags[column]
+        return self.bitmaps[column].get(value, Bitmap.empty(self.rows))
+
+    def isin(self, column: str, values) -> Bitmap:
+        """The rows whose column holds any of the values"""
+        result = Bitmap.empty(self.rows)
+        for value in values:
+            result = result | self.get(column, value)
+        return result
+
+    def between(self, column: str, lower, upper) -> Bitmap:
+        """The rows whose column is between lower and upper, inclusive, from the bitmaps of the values in the range"""
+        return self.isin(column, [value for value in self.bitmaps[column] if lower <= value <= upper])
+
+    def query(self, **conditions) -> Bitmap:
+        """
+        The rows that match every condition, i.e. query(state="IL", race=("Black", "Hispanic"), signs_of_mental_illness=True)
+        :param conditions: {column or flag: a value, or a list, tuple, or set of values that any of them matches}
+        """
+        result = self.all()
+        for column, value in conditions.items():
+            result = result & (self.isin(column, value) if isinstance(value, (list, tuple, set, frozenset)) else self.get(column, value))
+        return result
+
+    def row_ids(self, bitmap: Bitmap) -> np.ndarray:
+        """The ids of the shootings in a bitmap"""
+        if self.ids is None:
+            raise ValueError("The index was built without an id column")
+        return self.ids[bitmap.positions()]
+
+    def group_counts(self, column: str, bitmap: Bitmap = None) -> dict:
+        """{value: the number of rows with that value}, only counting the rows of a bitmap when one is given"""
+        return {value: (values if bitmap is None else values & bitmap).count() for value, values in self.bitmaps[column].items()}
@@ -0,0 +1,121 @@
+__author__ = "Len Washington III"
+
+from json import dump, load
+from os import makedirs
+from os.path import join
+import numpy as np
+import pandas as pd
+
+
+MANIFEST = "manifest.json"
+INDICATORS = "indicators.npy"
+FORMAT_VERSION = 1
+
+
+def write_packed(directory: str, rows: int, order: list, indicators: dict, columns: dict, strings: dict, missing: dict = None):
+    """
+    Saves a converted dataset as a folder of .npy files and a manifest.json
+    :param str directory: The folder. It is created if it does not exist.
+    :param int rows: The number of records.
+    :param list order: Every output column, in the order of the text file.
+    :param dict indicators: {output column: uint8 array of 0 and 1}. They are bit packed into one matrix, one row of bits per column.
+    :param dict columns: {output column: typed array}, i.e. int64 ids or datetime64[D] dates.
+    :param dict strings: {output column: (int32 codes, array of the unique strings)}
+    :param dict missing: {output column: the value that marks a missing value}, for the integer columns, which do not have NaN.
+    """
+    missing = missing or {}
+    makedirs(directory, exist_ok=True)
+    if indicators:
+        packed = np.packbits(np.vstack(list(indicators.values())).astype(np.uint8), axis=1)
+    else:
+        packed = np.zeros((0, (rows + 7) // 8), dtype=np.uint8)
+    np.save(join(directory, INDICATORS), packed)
+
+    manifest = {"format": FORMAT_VERSION, "rows": rows, "order": list(order), "indicators": {"file": INDICATORS, "columns": list(indicators)}, "columns": {}}
+    for number, (name, values) in enumerate(columns.items()):
+        file = f"column_{number}.npy"
+        np.save(join(directory, file), values)
+        manifest["columns"][name] = {"kind": "typed", "file": file, "dtype": str(values.dtype), "missing": missing.get(name)}
+    for number, (name, (codes, uniques)) in enumerate(strings.items()):
+        file, table = f"strings_{number}_codes.npy", f"strings_{number}.npy"
+        np.save(join(directory, file), codes)
+        np.save(join(directory, table), uniques)
+        manifest["columns"][name] = {"kind": "string", "file": file, "table": table, "dtype": str(uniques.dtype), "missing": None}
+    with open(join(directory, MANIFEST), 'w') as file:
+        dump(manifest, file, indent=1)
+
+
+class PackedDataset(object):
+    """
+    A dataset saved by Converter.convert_packed. The files are memory mapped, so opening it only reads the manifest, and a column is only read from the disk when it is used.
+    """
+    def __init__(self, directory: str, mmap=True):
+        """
+        :param str directory: The folder that holds the manifest and the .npy files.
+        :param bool mmap: Memory map the files instead of reading them into memory.
+        """
+        self.directory = directory
+        self.mmap_mode = "r" if mmap else None
+        with open(join(directory, MANIFEST)) as file:
+            self.manifest = load(file)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{directory} holds packed format {self.manifest.get('format')}, not {FORMAT_VERSION}")
+        self.rows = self.manifest["rows"]
+        self.indicator_columns = {name: i for i, name in enumerate(self.manifest["indicators"]["columns"])}
+        self._arrays = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __str__(self) -> str:
+        return f"Packed data about {self.rows:,} police shootings with {len(self.columns)} columns in {self.directory}"
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.indicator_columns or name in self.manifest["columns"]
+
+    def _load(self, file: str) -> np.ndarray:
+        if file not in self._arrays:
+            self._arrays[file] = np.load(join(self.directory, file), mmap_mode=self.mmap_mode)
+        return self._arrays[file]
+
+    @property
+    def columns(self) -> list:
+        return self.manifest["order"]
+
+    @property
+    def packed(self) -> np.ndarray:
+        """The bit packed indicators, one row of ceil(rows / 8) bytes per indicator column"""
+        return self._load(self.manifest["indicators"]["file"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """An indicator column as a bool array, a string column as an array of strings, or any other column as it was saved"""
+        if name in self.indicator_columns:
+            return np.unpackbits(self.packed[self.indicator_columns[name]], count=self.rows).astype(bool)
+        column = self.manifest["columns"][name]
+        if column["kind"] == "string":
+            return self._load(column["table"])[self._load(column["file"])]
+        return self._load(column["file"])
+
+    def codes(self, name: str) -> tuple:
+        """The codes and unique strings of a string column, without building the array of strings"""
+        column = self.manifest["columns"][name]
+        return self._load(column["file"]), self._load(column["table"])
+
+    def missing(self, name: str):
+        """The value that marks a missing value in an integer column, or None"""
+        return self.manifest["columns"].get(name, {}).get("missing")
+
+    def count(self, name: str) -> int:
+        """The number of records whose indicator is set"""
+        return int(np.unpackbits(self.packed[self.indicator_columns[name]], count=self.rows).sum())
+
+    def to_frame(self, columns=None) -> pd.DataFrame:
+        """The columns as a DataFrame, with missing integers as <NA>"""
+        frame = {}
+        for name in (self.columns if columns is None else columns):
+            values = self[name]
+            if self.missing(name) is not None:
+                values = pd.array(np.where(values == self.missing(name), 0, values), dtype=pd.Int64Dtype())
+                values[np.asarray(self[name]) == self.missing(name)] = pd.NA
+            frame[name] = values
+        return pd.DataFrame(frame)
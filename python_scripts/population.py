@@ -1,17 +1,29 @@
+from contextlib import nullcontext
 from requests import get
-from pandas import read_html
 try:
+    from cache import TableCache
+    from fetch import Fetcher, parse_tables
     from tools import add_data_dir
 except ModuleNotFoundError:
+    from .cache import TableCache
+    from .fetch import Fetcher, parse_tables
     from .tools import add_data_dir
 
 
-def get_tables_from_web(link: str):
-    return read_html(get(link).content)
+def get_tables_from_web(link: str, fetcher: Fetcher = None, cache: TableCache = None):
+    """
+    :param Fetcher fetcher: An optional Fetcher, whose session, rate limit, retries, and cache are used instead of a single request.
+    :param TableCache cache: An optional TableCache that the tables are read from, or stored in.
+    """
+    if cache is not None:
+        return cache.tables(link, fetcher=fetcher)
+    if fetcher is not None:
+        return fetcher.tables(link)
+    return parse_tables(get(link).content)
 
 
-def add_state_graduation_rates(states:list, link:str) -> list:
-    df = get_tables_from_web(link)[-1]
+def add_state_graduation_rates(states:list, link:str, fetcher:Fetcher=None) -> list:
+    df = get_tables_from_web(link, fetcher)[-1]
     for index, row in df.iterrows():
         state_name = row["State"]
         grad_rate = row["High School or Higher"]
@@ -52,7 +64,10 @@ def rearrange(lis:list) -> list:
 
 
 class StatePopulation(object):
-    def __init__(self, state_name: str, population_2021: int, growth_2021: float, population_2018: int, census_2010: int, growth_since_2010: float, percent_of_US: float, density: int):
+    def __init__(self, state_name: str, population_2021: int, growth_2021: float, population_2018: int, census_2010: int, growth_since_2010: float, percent_of_US: float, density: int, tables: list = None):
+        """
+        :param list tables: The tables of the state's page, if they were already fetched, i.e. by from_web. Otherwise the page is fetched now.
+        """
         self.state_name = state_name
         self.population_2021 = population_2021
         self.growth_2021 = growth_2021
@@ -61,14 +76,18 @@ class StatePopulation(object):
         self.growth_since_2010 = growth_since_2010
         self.percent_of_US = percent_of_US
         self.density = density
-        self.link = f"https://worldpopulationreview.com/states/{self.state_name.replace(' ','-').lower()}-population"
+        self.link = StatePopulation.page_link(state_name)
         self.graduation_rate = None
-        self._getData()
+        self._getData(tables)
 
-    def _getData(self):
-        tables = get_tables_from_web(self.link)
+    @staticmethod
+    def page_link(state_name: str) -> str:
+        return f"https://worldpopulationreview.com/states/{state_name.replace(' ','-').lower()}-population"
+
+    def _getData(self, tables: list = None):
+        tables = get_tables_from_web(self.link) if tables is None else tables
         if len(tables) != 13:
-            raise ValueError(f"{self.county_name}'s webpage: {self.link} does not have 14 tables")
+            raise ValueError(f"{self.state_name}'s webpage: {self.link} does not have 14 tables")
         else:
             self.race_data = tables[0]
             self.household_families = tables[1]
@@ -91,25 +110,40 @@ class StatePopulation(object):
         return self.state_name.upper()
 
     @staticmethod
-    def from_web(link: str):
-        df = get_tables_from_web(link)[-1]
-        return [StatePopulation(row["State"], row["2021 Pop."], row["2021 Growth"], row["2018 Pop."], row["2010 Census"], row["Growth Since 2010"], row["% of US"], row["Density (p/mi²)"]) for index, row in df.iterrows()]
+    def from_web(link: str, fetcher: Fetcher = None, errors: str = "raise"):
+        """
+        Fetches the list of states, then every state's page at once with a Fetcher
+        :param Fetcher fetcher: The Fetcher to use. A new one is made and closed if it is not given.
+        :param str errors: "raise" raises if any page could not be fetched, and "skip" leaves those states out.
+        """
+        with (Fetcher() if fetcher is None else nullcontext(fetcher)) as fetcher:
+            df = fetcher.tables(link)[-1]
+            rows = [(row["State"], row["2021 Pop."], row["2021 Growth"], row["2018 Pop."], row["2010 Census"], row["Growth Since 2010"], row["% of US"], row["Density (p/mi²)"]) for index, row in df.iterrows()]
+            tables = fetcher.fetch_tables([StatePopulation.page_link(row[0]) for row in rows], errors=errors)
+        return [StatePopulation(*row, tables=tables[StatePopulation.page_link(row[0])]) for row in rows if StatePopulation.page_link(row[0]) in tables]
 
 
 class CountyPopulation(object):
     STATE_DICTIONARY = {'Alabama': 'AL', 'Alaska': 'AK', 'American Samoa': 'AS','Arizona': 'AZ','Arkansas': 'AR','California': 'CA','Colorado': 'CO','Connecticut': 'CT','Delaware': 'DE','District of Columbia': 'DC','Florida': 'FL','Georgia': 'GA','Guam': 'GU','Hawaii': 'HI','Idaho': 'ID','Illinois': 'IL','Indiana': 'IN','Iowa': 'IA','Kansas': 'KS','Kentucky': 'KY','Louisiana': 'LA','Maine': 'ME','Maryland': 'MD','Massachusetts': 'MA','Michigan': 'MI','Minnesota': 'MN','Mississippi': 'MS','Missouri': 'MO','Montana': 'MT','Nebraska': 'NE','Nevada': 'NV','New Hampshire': 'NH','New Jersey': 'NJ','New Mexico': 'NM','New York': 'NY','North Carolina': 'NC','North Dakota': 'ND','Northern Mariana Islands': 'MP','Ohio': 'OH','Oklahoma': 'OK','Oregon': 'OR','Pennsylvania': 'PA','Puerto Rico': 'PR','Rhode Island': 'RI','South Carolina': 'SC','South Dakota': 'SD','Tennessee': 'TN','Texas': 'TX','Utah': 'UT','Vermont': 'VT','Virgin Islands': 'VI','Virginia': 'VA','Washington': 'WA','West Virginia': 'WV','Wisconsin': 'WI','Wyoming': 'WY'}
 
-    def __init__(self, county_name:str, state:str, population_2021:int, population_2010:int, growth_since_2010:float):
+    def __init__(self, county_name:str, state:str, population_2021:int, population_2010:int, growth_since_2010:float, tables:list=None):
+        """
+        :param list tables: The tables of the county's page, if they were already fetched, i.e. by from_web. Otherwise the page is fetched now.
+        """
         self.county_name = county_name
         self.state = state
         self.population_2021 = population_2021
         self.population_2010 = population_2010
         self.growth_since_2010 = growth_since_2010
-        self.link = f"https://worldpopulationreview.com/us-counties/{self.STATE_DICTIONARY[state].lower()}/{county_name.replace(' ', '-').lower()}-population"
-        self._getData()
+        self.link = CountyPopulation.page_link(county_name, state)
+        self._getData(tables)
+
+    @staticmethod
+    def page_link(county_name:str, state:str) -> str:
+        return f"https://worldpopulationreview.com/us-counties/{CountyPopulation.STATE_DICTIONARY[state].lower()}/{county_name.replace(' ', '-').lower()}-population"
 
-    def _getData(self):
-        tables = get_tables_from_web(self.link)
+    def _getData(self, tables:list=None):
+        tables = get_tables_from_web(self.link) if tables is None else tables
         if len(tables) != 14:
             raise ValueError(f"{self.county_name}'s webpage: {self.link} does not have 14 tables")
         else:
@@ -129,13 +163,22 @@ class CountyPopulation(object):
             self.veterans_by_race = tables[13]
 
     @staticmethod
-    def from_web(link:str):
-        df = get_tables_from_web(link)[-1]
-        return [CountyPopulation(row["County Name"], row["State"], row["2021 Population"], row["2010 Population"], row["Growth (since 2010)"]) for index, row in df.iterrows()]
+    def from_web(link:str, fetcher:Fetcher=None, errors:str="raise"):
+        """
+        Fetches the list of counties, then every county's page at once with a Fetcher, so a full refresh is not one request after another
+        :param Fetcher fetcher: The Fetcher to use. A new one is made and closed if it is not given.
+        :param str errors: "raise" raises if any page could not be fetched, and "skip" leaves those counties out.
+        """
+        with (Fetcher() if fetcher is None else nullcontext(fetcher)) as fetcher:
+            df = fetcher.tables(link)[-1]
+            rows = [(row["County Name"], row["State"], row["2021 Population"], row["2010 Population"], row["Growth (since 2010)"]) for index, row in df.iterrows()]
+            tables = fetcher.fetch_tables([CountyPopulation.page_link(row[0], row[1]) for row in rows], errors=errors)
+        return [CountyPopulation(*row, tables=tables[CountyPopulation.page_link(row[0], row[1])]) for row in rows if CountyPopulation.page_link(row[0], row[1]) in tables]
 
 
 if __name__ == "__main__":
-    countypop = CountyPopulation.from_web("https://worldpopulationreview.com/us-counties")
-    statepop = StatePopulation.from_web("https://worldpopulationreview.com/states")
-    statepop = add_state_graduation_rates(statepop, "https://worldpopulationreview.com/state-rankings/high-school-graduation-rates-by-state")
+    with Fetcher(max_workers=16, requests_per_second=8, cache=TableCache()) as fetcher:
+        countypop = CountyPopulation.from_web("https://worldpopulationreview.com/us-counties", fetcher=fetcher)
+        statepop = StatePopulation.from_web("https://worldpopulationreview.com/states", fetcher=fetcher)
+        statepop = add_state_graduation_rates(statepop, "https://worldpopulationreview.com/state-rankings/high-school-graduation-rates-by-state", fetcher)
     states_to_csv(statepop, add_data_dir("Education/state_data.csv"))
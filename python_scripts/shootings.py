@@ -1,17 +1,146 @@
 __author__ = "Len Washington III"
 
+from csv import QUOTE_NONE
 from datetime import datetime as dt
+from json import dump, load
+from os import remove, replace
+from os.path import exists
 from matplotlib import pyplot as plt
 from requests import get
 import numpy as np
+import pandas as pd
 try:
     from converter import Converter, add_data_dir
+    from packed import PackedDataset
 except ModuleNotFoundError:
     from .converter import Converter, add_data_dir
+    from .packed import PackedDataset
+
+
+UPPER_CASE_COLUMNS = ("state",)  # The copied input columns that are upper case instead of title case
+PARSERS = {
+    "int": lambda column: pd.to_numeric(column, errors="coerce").astype("Int64"),
+    "float": lambda column: pd.to_numeric(column, errors="coerce").astype(float),
+    "date": lambda column: pd.to_datetime(column, format="%Y-%m-%d", errors="coerce"),
+    "bool": lambda column: column.str.strip() == "1",
+    "title": lambda column: column.str.strip().str.title(),
+    "upper": lambda column: column.str.strip().str.upper(),
+}  # One conversion per column of strings. A value that does not parse is missing, instead of being kept as a string.
+
+
+def binary_schema(input_headers=Converter.STANDARD_INPUT_HEADERS, output_headers=Converter.STANDARD_OUTPUT_HEADERS, conversion_headers=Converter.STANDARD_CONVERSION_HEADERS, types=None) -> dict:
+    """
+    The type of each column of a binary file, worked out from the headers of the Converter that wrote it, so no cell's type has to be guessed
+    :param dict types: {input header: numpy dtype} of the copied columns, like Converter.convert_packed. Defaults to Converter.STANDARD_PACKED_TYPES, and a copied column that is not listed is a string.
+    :return: {output column: a key of PARSERS}
+    """
+    types = Converter.STANDARD_PACKED_TYPES if types is None else types
+    schema = {}
+    for header, outputs, conversion in zip(input_headers, output_headers, conversion_headers):
+        if len(conversion):  # Converted into "1"/"0" cells
+            schema.update((name, "bool") for name in ((outputs,) if isinstance(outputs, str) else outputs))
+        elif header in types:
+            schema[outputs] = {"i": "int", "u": "int", "f": "float", "M": "date"}[np.dtype(types[header]).kind]
+        else:
+            schema[outputs] = "upper" if header in UPPER_CASE_COLUMNS else "title"
+    return schema
+
+
+def parse_column(column: pd.Series, kind: str) -> pd.Series:
+    """Converts a column of strings with PARSERS[kind]. Most values repeat, so the column is made categorical, only its categories are parsed, and the column is filled in from the codes."""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype("category")
+    categories = pd.Series(list(column.cat.categories.astype(str)) + [""], dtype=object)  # A missing value's code is -1, which takes the last one
+    return pd.Series(PARSERS[kind](categories).array.take(column.cat.codes.to_numpy()), index=column.index)
+
+
+def parse_binary_frame(frame: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Converts a DataFrame of the binary file's strings one whole column at a time"""
+    return pd.DataFrame({column: parse_column(frame[column], kind) for column, kind in schema.items()})
+
+
+def _read_binary(file, delimiter: str, hasHeader: bool, schema: dict, **kwargs):
+    return pd.read_csv(file, sep=delimiter, skipinitialspace=True, header=0 if hasHeader else None, names=list(schema), usecols=range(len(schema)),
+                       index_col=False, dtype="category", keep_default_na=False, quoting=QUOTE_NONE, **kwargs)
+
+
+def read_binary_csv(file, delimiter=",", hasHeader=True, schema=None) -> pd.DataFrame:
+    """
+    Reads the binary file that Converter writes into typed columns
+    :param dict schema: The binary_schema of the file. Defaults to the standard headers.
+    """
+    schema = binary_schema() if schema is None else schema
+    return parse_binary_frame(_read_binary(file, delimiter, hasHeader, schema), schema)
+
+
+def iter_binary_csv(file, delimiter=",", hasHeader=True, schema=None, chunksize=50_000):
+    """Like read_binary_csv, but yields a DataFrame of ``chunksize`` rows at a time, so a large file is never in memory at once"""
+    schema = binary_schema() if schema is None else schema
+    with _read_binary(file, delimiter, hasHeader, schema, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield parse_binary_frame(chunk, schema)
+
+
+def read_meta(file: str) -> dict:
+    """The sidecar of a downloaded file, with the url, ETag, and Last-Modified it was downloaded with and a hash of each of its rows, or {} if there is none"""
+    try:
+        with open(f"{file}.meta.json") as meta:
+            return load(meta)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_meta(file: str, meta: dict):
+    with open(f"{file}.meta.json.part", 'w') as output:
+        dump(meta, output)
+    replace(f"{file}.meta.json.part", f"{file}.meta.json")
+
+
+def download(url: str, file: str, meta: dict = None, session=None, chunk_size=1 << 16, timeout=60) -> dict | None:
+    """
+    Streams a url into a file, a block at a time, instead of holding the body as one string
+    :param dict meta: The sidecar of the previous download, from read_meta. If it is for the same url, the request is conditional, and nothing is downloaded when the server answers 304 Not Modified.
+    :param session: An optional requests.Session, so the connection is reused.
+    :return: The url, ETag, and Last-Modified of the download, or None if the file has not changed. The file is only replaced once the whole body has arrived.
+    """
+    headers = {}
+    if meta and meta.get("url") == url and exists(file):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    with (get if session is None else session.get)(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        with open(f"{file}.part", 'wb') as output:
+            for block in response.iter_content(chunk_size):
+                output.write(block)
+        replace(f"{file}.part", file)
+        return {"url": url, "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+
+def row_hashes(frame: pd.DataFrame) -> tuple:
+    """The id of each row, its first column, and a hash of the whole row, as two Series"""
+    return frame.iloc[:, 0].str.strip(), pd.util.hash_pandas_object(frame, index=False).astype(str)
+
+
+def python_values(series: pd.Series) -> list:
+    """A column as Python values, i.e. bools, ints, datetimes, and "" when a value is missing, like the attributes of Shootings"""
+    if series.dtype == bool:
+        return series.tolist()
+    values = [value.to_pydatetime() for value in series] if series.dtype.kind == "M" else series.astype(object).tolist()
+    return ["" if value is None or value is pd.NaT or value is pd.NA or value != value else value for value in values]
 
 
 class Shootings(object):
     """This class was made for analyzing data from the Washington Post's Fatal Force Github repository about shootings from 1/1/2015"""
+    ATTRIBUTES = ("id", "name", "date", "shot", "shot_and_tasered", "arm_undetermined", "arm_unknown", "unarmed", "age", "male", "female", "unknown_gender",
+                  "is_white_non_hispanic", "is_black_non_hispanic", "is_asian", "is_native_american", "is_hispanic", "other_race", "unknown_race", "city", "state",
+                  "signs_of_mental_illness", "threat_level_attack", "threat_level_other", "threat_level_undetermined", "fled_by_foot", "fled_by_car", "not_fleeing",
+                  "body_camera", "longitude", "latitude", "is_geocoding_exact")  # In the order of the binary file's columns and of __init__'s parameters
+    __slots__ = ATTRIBUTES  # Without a __dict__ per shooting, a list of them, or a ShootingView, is smaller
+
     def __init__(self, ID: int, name: str, date: dt, shot: bool, shot_and_tasered: bool,
                  arm_undetermined: bool, arm_unknown: bool, unarmed: bool, age: int,
                  male: bool, female: bool, unknown_gender: bool, is_white_non_hispanic: bool, is_black_non_hispanic: bool,
@@ -136,6 +265,8 @@ class Shootings(object):
             return "Native American"
         elif self.is_hispanic:
             return "Hispanic"
+        elif self.other_race:
+            return "Other"
         elif self.unknown_race:
             return "UNKNOWN RACE"
         else:
@@ -165,63 +296,243 @@ class Shootings(object):
         return self.id
 
     @staticmethod
-    def from_web(url="https://raw.githubusercontent.com/washingtonpost/data-police-shootings/master/fatal-police-shootings-data.csv", full_file="fatal-police-shooting-web.csv", bin_file="binary-fatal-police-shooting-web.csv", delimiter=",", hasHeader=True) -> list:
-        data = get(url).text.replace("  ", " ").split("\r\n")
-        with open(full_file, "w") as file:
-            file.write("\n".join(data))
-        convert = Converter(full_file, bin_file)
-
-        convert.setInputHeaders(Converter.STANDARD_INPUT_HEADERS)
-        convert.setOutputHeaders(Converter.STANDARD_OUTPUT_HEADERS)
-        convert.setConversionHeaders(Converter.STANDARD_CONVERSION_HEADERS)
+    def from_web(url="https://raw.githubusercontent.com/washingtonpost/data-police-shootings/master/fatal-police-shootings-data.csv", full_file="fatal-police-shooting-web.csv", bin_file="binary-fatal-police-shooting-web.csv", delimiter=",", hasHeader=True, refresh=False, session=None) -> list:
+        """
+        :param bool refresh: Send a conditional request with the ETag and Last-Modified of the last download, kept next to full_file, and only convert the rows that are new or changed since then. When nothing changed, bin_file is read as it is.
+        :param session: An optional requests.Session for the download.
+        """
+        if refresh:
+            return Shootings.refresh_from_web(url, full_file, bin_file, delimiter=delimiter, hasHeader=hasHeader, session=session)
+        meta = download(url, full_file, session=session)
+        convert = Shootings._converter(full_file, bin_file)
 
         for (inp, output, conv) in zip(convert.input_headers, convert.output_headers, convert.conversion_headers):
             print(f"{inp} : {output} : {conv}")
 
-        convert.convert_binary()
+        convert.convert_binary(stream=True)
+        meta["rows"] = dict(zip(*row_hashes(pd.read_csv(full_file, dtype=str, keep_default_na=False))))
+        write_meta(full_file, meta)
+        return Shootings.from_csv(bin_file, delimiter=delimiter, hasHeader=hasHeader)
+
+    @staticmethod
+    def refresh_from_web(url, full_file, bin_file, delimiter=",", hasHeader=True, session=None) -> list:
+        """
+        Downloads the file again only if the server says it changed, and converts only the rows whose id is new or whose row changed. The rows of changed or removed ids are dropped from bin_file, and the converted rows are appended.
+        If bin_file does not exist, every row is converted.
+        """
+        meta = read_meta(full_file)
+        if not exists(bin_file):
+            meta.pop("rows", None)
+        downloaded = download(url, full_file, meta, session=session)
+        if downloaded is None and "rows" in meta:
+            return Shootings.from_csv(bin_file, delimiter=delimiter, hasHeader=hasHeader)
+
+        frame = pd.read_csv(full_file, dtype=str, keep_default_na=False)
+        ids, hashes = row_hashes(frame)
+        rows = dict(zip(ids, hashes))
+        old_rows = meta.get("rows", {})
+        changed = (ids.map(old_rows) != hashes).to_numpy(dtype=bool)
+        dropped = {row_id for row_id, row_hash in old_rows.items() if rows.get(row_id) != row_hash}
+        if any(changed) or dropped:
+            Shootings._merge_binary(frame[changed], full_file, bin_file, dropped)
+        meta.update(downloaded or {})
+        meta["rows"] = rows
+        write_meta(full_file, meta)
         return Shootings.from_csv(bin_file, delimiter=delimiter, hasHeader=hasHeader)
 
     @staticmethod
-    def from_csv(file, delimiter=",", hasHeader=True) -> list:
-        data = open(file).readlines()
-        if hasHeader:
-            data.pop(0)
-        data = [[i.title() for i in person.split(delimiter)] for person in data]
-        everything = []
-        for person in data:
-            tmp = []
-            for detail in person:
-                try:
-                    detail = float(detail)
-                    if int(detail) == detail:
-                        detail = int(detail)
-                        if detail == 1 or detail == 0:
-                            detail = bool(detail)
-                except ValueError:
-                    try:
-                        detail = dt.strptime(detail.strip(" "), "%Y-%m-%d")
-                    except ValueError:
-                        pass
-                tmp.append(detail)
-
-            obj = Shootings(tmp[0], tmp[1], tmp[2], tmp[3], tmp[4], tmp[5], tmp[6], tmp[7], tmp[8], tmp[9], tmp[10], tmp[11], tmp[12], tmp[13], tmp[14], tmp[15], tmp[16], tmp[17], tmp[18], tmp[19].strip(" "), tmp[20].upper().strip(" "), tmp[21], tmp[22], tmp[23], tmp[24], tmp[25], tmp[26], tmp[27], tmp[28], tmp[29], tmp[30], tmp[31])
-            everything.append(obj)
-        return everything
+    def _converter(input_file, output_file) -> Converter:
+        convert = Converter(input_file, output_file)
+        convert.setInputHeaders(Converter.STANDARD_INPUT_HEADERS)
+        convert.setOutputHeaders(Converter.STANDARD_OUTPUT_HEADERS)
+        convert.setConversionHeaders("standard")
+        return convert
+
+    @staticmethod
+    def _merge_binary(frame: pd.DataFrame, full_file: str, bin_file: str, dropped: set):
+        """Converts the rows of a frame of the downloaded file, and writes them into bin_file in place of the rows whose ids were dropped"""
+        new_file, converted_file = f"{full_file}.new.csv", f"{bin_file}.new.csv"
+        frame.to_csv(new_file, index=False)
+        Shootings._converter(new_file, converted_file).convert_binary(stream=True)
+        with open(converted_file) as converted:
+            header = converted.readline()
+            lines = converted.readlines()
+        if not exists(bin_file) or dropped:
+            kept = []
+            if exists(bin_file):
+                with open(bin_file) as binary:
+                    binary.readline()
+                    kept = [line for line in binary if line.split(",", 1)[0].strip() not in dropped]
+            with open(f"{bin_file}.part", 'w') as output:
+                output.writelines([header] + kept + lines)
+            replace(f"{bin_file}.part", bin_file)
+        else:
+            with open(bin_file, 'a') as output:
+                output.writelines(lines)
+        remove(new_file)
+        remove(converted_file)
+
+    @staticmethod
+    def from_csv(file, delimiter=",", hasHeader=True, chunksize=50_000) -> list:
+        """Reads the binary file that Converter writes. Each column is parsed with its type from binary_schema, so an age of 1 stays 1 instead of becoming True."""
+        return list(Shootings.iter_csv(file, delimiter=delimiter, hasHeader=hasHeader, chunksize=chunksize))
+
+    @staticmethod
+    def iter_csv(file, delimiter=",", hasHeader=True, chunksize=50_000):
+        """Like from_csv, but yields the shootings as they are read, ``chunksize`` rows at a time"""
+        for frame in iter_binary_csv(file, delimiter=delimiter, hasHeader=hasHeader, chunksize=chunksize):
+            yield from Shootings.from_frame(frame)
+
+    @staticmethod
+    def from_frame(frame: pd.DataFrame) -> list:
+        """Builds a Shootings object from each row of a typed DataFrame whose columns are in the order of ATTRIBUTES"""
+        return [Shootings(*row) for row in zip(*[python_values(frame[column]) for column in frame.columns[:len(Shootings.ATTRIBUTES)]])]
+
+
+class ShootingView(Shootings):
+    """One row of a ShootingsTable that behaves like a Shootings object. Its attributes are read from the table's columns when they are used, instead of being copied into the object."""
+    __slots__ = ("_table", "_position")  # The slots of Shootings are left empty, so reading one falls through to __getattr__
+
+    def __init__(self, table, position: int):
+        self._table = table
+        self._position = position
+
+    def __getattr__(self, name: str):
+        if name in Shootings.ATTRIBUTES:
+            return self._table.values(name)[self._position]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+
+class ShootingsTable(object):
+    """
+    The shootings held as one DataFrame column per attribute of Shootings, instead of a list of Shootings objects, so filters and counts run over whole columns.
+    The indicator columns are combined into the categorical columns race, gender, threat_level, and flee.
+    """
+    CATEGORIES = {
+        "race": (("is_white_non_hispanic", "White"), ("is_black_non_hispanic", "Black"), ("is_asian", "Asian"), ("is_native_american", "Native American"),
+                 ("is_hispanic", "Hispanic"), ("other_race", "Other"), ("unknown_race", "UNKNOWN RACE")),
+        "gender": (("male", "Male"), ("female", "Female"), ("unknown_gender", "UNKNOWN GENDER")),
+        "threat_level": (("threat_level_attack", "Attack"), ("threat_level_other", "Other"), ("threat_level_undetermined", "Undetermined")),
+        "flee": (("fled_by_foot", "Foot"), ("fled_by_car", "Car"), ("not_fleeing", "Not Fleeing")),
+    }  # {column: ((indicator column, category), ...)}. The first indicator that is set wins, in the same order as getRace and getGender. A row without one is missing, where getRace returns "" and getGender None.
+    INDICATORS = tuple(attribute for attribute in Shootings.ATTRIBUTES if attribute not in ("id", "name", "date", "age", "city", "state", "longitude", "latitude"))
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        :param pandas.DataFrame frame: A column for each of Shootings.ATTRIBUTES, with typed values. The categorical columns are added if they are missing.
+        """
+        self.frame = frame.reset_index(drop=True)
+        for column, choices in ShootingsTable.CATEGORIES.items():
+            if column not in self.frame:
+                codes = np.select([self.frame[indicator].to_numpy(dtype=bool) for indicator, _ in choices], np.arange(len(choices)), -1)
+                self.frame[column] = pd.Categorical.from_codes(codes, [category for _, category in choices])
+        self._values = {}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def __str__(self) -> str:
+        return f"Table of {len(self):,} police shootings"
+
+    def __iter__(self):
+        return (ShootingView(self, position) for position in range(len(self)))
+
+    def __getitem__(self, key):
+        """A column for a column name, a ShootingView for a position, and a new table for a boolean mask or a slice"""
+        if isinstance(key, str):
+            return self.frame[key]
+        if isinstance(key, (int, np.integer)):
+            return ShootingView(self, int(key) + len(self) if key < 0 else int(key))
+        if isinstance(key, slice):
+            return ShootingsTable(self.frame.iloc[key])
+        return ShootingsTable(self.frame[self._mask(key)])
+
+    @staticmethod
+    def _mask(mask) -> np.ndarray:
+        """A boolean array from a mask whose missing values, like the ones of a comparison against a missing age, are False"""
+        return pd.Series(mask).fillna(False).to_numpy(dtype=bool) if isinstance(mask, pd.Series) else np.asarray(mask, dtype=bool)
+
+    def values(self, column: str) -> list:
+        """The column as the Python values that Shootings.from_csv would have given, i.e. bools, ints, datetimes, and "" when a value is missing. It is built once per table."""
+        if column not in self._values:
+            self._values[column] = python_values(self.frame[column])
+        return self._values[column]
+
+    def filter(self, mask=None, **equals):
+        """
+        The rows that match every condition, as a new table
+        :param mask: An optional boolean Series or array, i.e. table["age"].between(13, 19)
+        :param equals: {column: value} or {column: a list, tuple, or set of values}, i.e. race="Black", state=("IL", "IN")
+        """
+        keep = np.ones(len(self), dtype=bool) if mask is None else self._mask(mask)
+        for column, value in equals.items():
+            series = self.frame[column]
+            keep &= self._mask(series.isin(value) if isinstance(value, (list, tuple, set, frozenset)) else series == value)
+        return self[keep]
+
+    def select(self, *columns: str) -> pd.DataFrame:
+        """The columns as a DataFrame"""
+        return self.frame[list(columns)]
+
+    def group_counts(self, *columns: str) -> pd.Series:
+        """The number of rows for each combination of the columns' values. Categories without any rows are left out."""
+        return self.frame.groupby(list(columns), observed=True).size()
+
+    def to_shootings(self) -> list:
+        """The rows as Shootings objects, for code that needs its own copies"""
+        return [Shootings(*row) for row in zip(*[self.values(attribute) for attribute in Shootings.ATTRIBUTES])]
+
+    @staticmethod
+    def _typed(frame: pd.DataFrame) -> pd.DataFrame:
+        """Converts a DataFrame of strings, or of the packed columns, to the table's types"""
+        frame["id"] = pd.to_numeric(frame["id"], errors="coerce").astype("Int64")
+        frame["age"] = pd.to_numeric(frame["age"], errors="coerce").astype("Int64")
+        frame["date"] = pd.to_datetime(frame["date"], format="%Y-%m-%d", errors="coerce")
+        for column in ("longitude", "latitude"):
+            frame[column] = pd.to_numeric(frame[column], errors="coerce").astype(float)
+        for column in ShootingsTable.INDICATORS:
+            frame[column] = frame[column] if frame[column].dtype == bool else frame[column].isin([1, "1"])
+        for column in ("name", "city", "state"):
+            frame[column] = frame[column].fillna("").astype(str).str.strip()
+        frame["name"] = frame["name"].str.title()
+        frame["city"] = frame["city"].str.title()
+        frame["state"] = frame["state"].str.upper()
+        return frame
+
+    @staticmethod
+    def from_csv(file, delimiter=",", hasHeader=True):
+        """Reads the binary file that Converter writes with read_binary_csv"""
+        frame = read_binary_csv(file, delimiter=delimiter, hasHeader=hasHeader)
+        frame.columns = list(Shootings.ATTRIBUTES)
+        return ShootingsTable(frame)
+
+    @staticmethod
+    def from_packed(directory: str):
+        """Reads the folder that Converter.convert_packed writes"""
+        frame = PackedDataset(directory).to_frame()
+        frame.columns = list(Shootings.ATTRIBUTES)
+        return ShootingsTable(ShootingsTable._typed(frame))
+
+    @staticmethod
+    def from_shootings(shootings: list):
+        """Builds a table from a list of Shootings objects"""
+        frame = pd.DataFrame([[getattr(person, attribute) for attribute in Shootings.ATTRIBUTES] for person in shootings], columns=list(Shootings.ATTRIBUTES))
+        return ShootingsTable(ShootingsTable._typed(frame))
 
 
 def main():
     lower, upper = 13, 19
-    lis = Shootings.from_csv(add_data_dir("data-police-shootings/binary-data.csv"))
-    plotting = [person for person in lis if person.is_black_non_hispanic and (lower <= (0 if person.age == "" else person.age) <= upper) and (person.getGender() == "Male")]
-    # chi = [person for person in plotting if person.is_black_non_hispanic and person.state == "IL"]
-    # x = [person.age for person in plotting]
-    # y = [(person.date.date() - date(2015, 1, 1)).days for person in plotting]
+    table = ShootingsTable.from_csv(add_data_dir("data-police-shootings/binary-data.csv"))
+    plotting = table.filter(table["age"].between(lower, upper), race="Black", gender="Male")
+    # chi = plotting.filter(state="IL")
+    ill = plotting["signs_of_mental_illness"]
+    days = (plotting["date"] - pd.Timestamp(2015, 1, 1)).dt.days
 
-    x1 = [person.age for person in plotting if person.signs_of_mental_illness]
-    x2 = [person.age for person in plotting if not person.signs_of_mental_illness]
+    x1 = plotting["age"][ill]
+    x2 = plotting["age"][~ill]
 
-    y1 = [(person.date.date() - date(2015, 1, 1)).days for person in plotting if person.signs_of_mental_illness]
-    y2 = [(person.date.date() - date(2015, 1, 1)).days for person in plotting if not person.signs_of_mental_illness]
+    y1 = days[ill]
+    y2 = days[~ill]
     plt.scatter(x2, y2, c=["red"], label="Shows Signs of Mental Illness")
     plt.scatter(x1, y1, c=["blue"], label="Don't show signs of Mental Illness")
     plt.xticks(np.arange(lower, upper+1, step=1))
@@ -0,0 +1,152 @@
+__author__ = "Len Washington III"
+
+from scipy.spatial import cKDTree
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088  # The mean radius of the Earth
+
+
+def to_unit_vectors(latitude, longitude) -> np.ndarray:
+    """Points on the unit sphere for coordinates in degrees, as an (n, 3) array. The straight line distance between two of them only grows with their great-circle distance, so a k-d tree over them answers great-circle queries."""
+    latitude, longitude = np.radians(np.asarray(latitude, dtype=float)), np.radians(np.asarray(longitude, dtype=float))
+    cos_latitude = np.cos(latitude)
+    return np.column_stack((cos_latitude * np.cos(longitude), cos_latitude * np.sin(longitude), np.sin(latitude)))
+
+
+def great_circle_km(latitude1, longitude1, latitude2, longitude2) -> np.ndarray:
+    """The haversine distance in kilometers between coordinates in degrees. The arguments are broadcast against each other."""
+    latitude1, longitude1, latitude2, longitude2 = (np.radians(np.asarray(value, dtype=float)) for value in (latitude1, longitude1, latitude2, longitude2))
+    a = np.sin((latitude2 - latitude1) / 2) ** 2 + np.cos(latitude1) * np.cos(latitude2) * np.sin((longitude2 - longitude1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _chord(km: float) -> float:
+    """The straight line distance on the unit sphere for a great-circle distance in kilometers"""
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def _arc_km(chords) -> np.ndarray:
+    """The great-circle distance in kilometers for straight line distances on the unit sphere"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chords, dtype=float) / 2, 0, 1))
+
+
+class SpatialIndex(object):
+    """
+    A k-d tree over the coordinates of a dataset, built once, that finds the incidents within a radius, the nearest incidents, or the incidents in a bounding box without looping over every row.
+    Results are positions of rows in the dataset that the index was built from, with their great-circle distances in kilometers. Rows without coordinates are left out.
+    """
+    def __init__(self, latitude, longitude, ids=None, leafsize: int = 32):
+        """
+        :param latitude: The latitude of each row, in degrees. Missing values are NaN.
+        :param longitude: The longitude of each row, in degrees.
+        :param ids: An optional id for each row, which row_ids() looks up.
+        :param int leafsize: The leaf size of the tree.
+        """
+        latitude, longitude = np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)
+        self.rows = len(latitude)
+        self.positions = np.flatnonzero(~(np.isnan(latitude) | np.isnan(longitude)))  # The row of each point in the tree
+        self.latitude = latitude[self.positions]
+        self.longitude = longitude[self.positions]
+        self.ids = None if ids is None else np.asarray(ids)
+        self.tree = cKDTree(to_unit_vectors(self.latitude, self.longitude), leafsize=leafsize)
+
+    @staticmethod
+    def from_table(table, latitude: str = "latitude", longitude: str = "longitude", id_column: str = "id"):
+        """
+        :param table: A ShootingsTable, or a DataFrame with latitude and longitude columns, like the Mapping Police Violence records.
+        """
+        frame = table.frame if hasattr(table, "frame") else table
+        return SpatialIndex(frame[latitude].to_numpy(dtype=float, na_value=np.nan), frame[longitude].to_numpy(dtype=float, na_value=np.nan),
+                            ids=frame[id_column].to_numpy() if id_column in frame else None)
+
+    @staticmethod
+    def from_shootings(shootings: list):
+        """Builds an index from a list of Shootings objects with getGeoCoordinates"""
+        coordinates = [person.getGeoCoordinates() for person in shootings]
+        latitude = [np.nan if latitude == "" else latitude for latitude, _ in coordinates]
+        longitude = [np.nan if longitude == "" else longitude for _, longitude in coordinates]
+        return SpatialIndex(latitude, longitude, ids=[person.id for person in shootings])
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __str__(self) -> str:
+        return f"Spatial index of {len(self):,} out of {self.rows:,} rows with coordinates"
+
+    def row_ids(self, positions) -> np.ndarray:
+        """The ids of rows found by a query"""
+        if self.ids is None:
+            raise ValueError("The index was built without ids")
+        return self.ids[np.asarray(positions, dtype=int)]
+
+    def _sorted(self, points, latitude: float, longitude: float, km: float = None) -> tuple:
+        points = np.asarray(points, dtype=int)
+        distances = great_circle_km(latitude, longitude, self.latitude[points], self.longitude[points])
+        if km is not None:  # Drop the points the tree let in through rounding
+            keep = distances <= km
+            points, distances = points[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return self.positions[points[order]], distances[order]
+
+    def radius(self, latitude: float, longitude: float, km: float) -> tuple:
+        """
+        The rows within ``km`` kilometers of a point
+        :return: The positions of the rows and their distances, closest first
+        """
+        return self._sorted(self.tree.query_ball_point(to_unit_vectors(latitude, longitude)[0], _chord(km)), latitude, longitude, km)
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1) -> tuple:
+        """
+        The ``k`` rows closest to a point
+        :return: The positions of the rows and their distances, closest first
+        """
+        chords, points = self.tree.query(to_unit_vectors(latitude, longitude)[0], k=min(k, len(self)))
+        points = np.atleast_1d(points)
+        return self.positions[points], _arc_km(np.atleast_1d(chords))
+
+    def bbox(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """
+        The positions of the rows inside a bounding box, in order. A box whose west edge is east of its east edge crosses the 180th meridian.
+        The tree finds the points in the circle around the box, and only those are checked against its edges.
+        """
+        crosses = west > east
+        center_longitude = (west + east + (360 if crosses else 0)) / 2
+        center_latitude = (south + north) / 2
+        corners_latitude = np.array([south, south, north, north, center_latitude, center_latitude])
+        corners_longitude = np.array([west, east, west, east, west, east])
+        km = great_circle_km(center_latitude, center_longitude, corners_latitude, corners_longitude).max()
+        if north - south >= 90 or (east - west) % 360 >= 180:
+            points = np.arange(len(self))  # The circle would cover most of the globe
+        else:
+            points = np.asarray(self.tree.query_ball_point(to_unit_vectors(center_latitude, center_longitude)[0], _chord(km) * (1 + 1e-9)), dtype=int)
+        latitude, longitude = self.latitude[points], self.longitude[points]
+        inside = (south <= latitude) & (latitude <= north)
+        inside &= ((longitude >= west) | (longitude <= east)) if crosses else ((west <= longitude) & (longitude <= east))
+        return np.sort(self.positions[points[inside]])
+
+    def radius_batch(self, latitudes, longitudes, km) -> list:
+        """
+        The rows within ``km`` kilometers of each of many points, i.e. every zipcode centroid, in one call into the tree
+        :param km: One radius for every point, or a radius per point.
+        :return: A (positions, distances) tuple for each point, closest first
+        """
+        latitudes, longitudes = np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float)
+        kms = np.broadcast_to(np.asarray(km, dtype=float), latitudes.shape)
+        results = self.tree.query_ball_point(to_unit_vectors(latitudes, longitudes), [_chord(value) for value in kms])
+        return [self._sorted(points, latitude, longitude, value) for points, latitude, longitude, value in zip(results, latitudes, longitudes, kms)]
+
+    def count_within(self, latitudes, longitudes, km) -> np.ndarray:
+        """The number of rows within ``km`` kilometers of each of many points, without building the lists of rows"""
+        latitudes = np.asarray(latitudes, dtype=float)
+        kms = np.broadcast_to(np.asarray(km, dtype=float), latitudes.shape)
+        return np.asarray(self.tree.query_ball_point(to_unit_vectors(latitudes, longitudes), [_chord(value) for value in kms], return_length=True))
+
+    def nearest_batch(self, latitudes, longitudes, k: int = 1) -> tuple:
+        """
+        The ``k`` rows closest to each of many points
+        :return: The positions, as an (n, k) array, and the distances of the rows, closest first
+        """
+        chords, points = self.tree.query(to_unit_vectors(latitudes, longitudes), k=min(k, len(self)))
+        points, chords = points.reshape(len(points), -1), chords.reshape(len(chords), -1)
+        return self.positions[points], _arc_km(chords)
@@ -0,0 +1,101 @@
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import exists, getmtime, join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from python_scripts.shootings import Shootings
+
+
+HEADER = "id,name,date,manner_of_death,armed,age,gender,race,city,state,signs_of_mental_illness,threat_level,flee,body_camera,longitude,latitude,is_geocoding_exact\n"
+ROWS = ["3,Tim Elliot,2015-01-02,shot,gun,53,M,A,Shelton,WA,True,attack,Not fleeing,False,-123.122,47.247,True\n",
+		"4,Lewis Lee Lembke,2015-01-02,shot,gun,47,M,W,Aloha,OR,False,attack,Not fleeing,False,-122.892,45.487,True\n",
+		"5,John Paul Quintero,2015-01-03,shot and Tasered,unarmed,23,M,H,Wichita,KS,False,other,Not fleeing,False,-97.281,37.695,True\n"]
+
+
+class FileHandler(BaseHTTPRequestHandler):
+	"""Serves the server's body with its ETag, and answers 304 when the request has that ETag"""
+	def do_GET(self):
+		self.server.requests.append(self.headers.get("If-None-Match"))
+		if self.headers.get("If-None-Match") == self.server.etag:
+			self.send_response(304)
+			self.end_headers()
+			return
+		body = self.server.body.encode()
+		self.send_response(200)
+		self.send_header("ETag", self.server.etag)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class TestRefreshFromWeb(unittest.TestCase):
+	def setUp(self):
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+		self.server.requests = []
+		self.publish(ROWS, '"1"')
+		Thread(target=self.server.serve_forever, daemon=True).start()
+		self.url = f"http://127.0.0.1:{self.server.server_address[1]}/fatal-police-shootings-data.csv"
+		self.directory = TemporaryDirectory()
+		self.full_file = join(self.directory.name, "full.csv")
+		self.bin_file = join(self.directory.name, "binary.csv")
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		self.directory.cleanup()
+
+	def publish(self, rows, etag):
+		self.server.body = HEADER + "".join(rows)
+		self.server.etag = etag
+
+	def refresh(self) -> list:
+		return Shootings.from_web(self.url, full_file=self.full_file, bin_file=self.bin_file, refresh=True)
+
+	def converted_lines(self) -> list:
+		"""The lines of the binary file, against those of a full conversion of the file that was downloaded"""
+		reference = join(self.directory.name, "reference.csv")
+		Shootings._converter(self.full_file, reference).convert_binary(stream=True)
+		with open(self.bin_file) as binary, open(reference) as expected:
+			return binary.readlines(), expected.readlines()
+
+	@staticmethod
+	def summary(shootings: list) -> list:
+		return sorted((person.id, person.name, person.age, person.getRace()) for person in shootings)
+
+	def test_not_modified(self):
+		first = self.refresh()
+		modified = getmtime(self.bin_file)
+		second = self.refresh()
+		self.assertEqual(self.server.requests, [None, '"1"'])  # The second request was conditional and answered with 304
+		self.assertEqual(getmtime(self.bin_file), modified)
+		self.assertEqual(self.summary(second), self.summary(first))
+		self.assertEqual(len(second), 3)
+
+	def test_append_only(self):
+		self.refresh()
+		with open(self.bin_file) as binary:
+			before = binary.readlines()
+		self.publish(ROWS + ["8,Matthew Hoffman,2015-01-04,shot,toy weapon,32,M,W,San Francisco,CA,True,attack,Not fleeing,False,-122.422,37.763,True\n"], '"2"')
+		shootings = self.refresh()
+		lines, expected = self.converted_lines()
+		self.assertEqual(lines[:len(before)], before)  # The old rows are kept as they were, and the new one is appended
+		self.assertEqual(lines, expected)
+		self.assertEqual([person.id for person in shootings], [3, 4, 5, 8])
+
+	def test_changed_row_merge(self):
+		self.refresh()
+		changed = ROWS[1].replace("Lewis Lee Lembke", "Lewis Lembke").replace(",47,", ",48,")
+		self.publish([ROWS[0], changed], '"3"')  # One row changed and one removed
+		shootings = self.refresh()
+		lines, expected = self.converted_lines()
+		self.assertEqual(lines[0], expected[0])
+		self.assertEqual(sorted(lines[1:]), sorted(expected[1:]))
+		self.assertEqual(self.summary(shootings), [(3, "Tim Elliot", 53, "Asian"), (4, "Lewis Lembke", 48, "White")])
+		self.assertFalse(exists(f"{self.full_file}.new.csv") or exists(f"{self.bin_file}.new.csv"))
+
+
+if __name__ == "__main__":
+	unittest.main()
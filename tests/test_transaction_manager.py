@@ -0,0 +1,53 @@
+import sqlite3
+import unittest
+from database.tools import TransactionManager
+
+
+class TestTransactionManager(unittest.TestCase):
+	def setUp(self):
+		self.db = sqlite3.connect(":memory:")
+		self.db.execute("CREATE TABLE t(id INTEGER PRIMARY KEY)")
+		self.db.commit()
+
+	def tearDown(self):
+		self.db.close()
+
+	def test_failed_batch_does_not_commit(self):
+		"""With every_seconds=0 every batch is due a commit, but one that was rolled back must leave that to the next batch, after the caller has handled its error"""
+		commits = []
+		transactions = TransactionManager(self.db, every_seconds=0, savepoints=True, on_commit=lambda: commits.append(len(transactions.results)))
+
+		with transactions.batch(1):
+			self.db.execute("INSERT INTO t(id) VALUES (1)")
+		self.assertEqual(commits, [1])
+
+		with transactions.batch(1) as result:
+			self.db.execute("INSERT INTO t(id) VALUES (2)")
+			raise ValueError("bad row")
+		self.assertEqual(result["status"], "rolled back")
+		self.assertEqual(commits, [1])
+
+		with transactions.batch(1):
+			self.db.execute("INSERT INTO t(id) VALUES (3)")
+		self.assertEqual(commits, [1, 3])
+		self.assertEqual([row[0] for row in self.db.execute("SELECT id FROM t ORDER BY id")], [1, 3])
+		self.assertEqual([result["status"] for result in transactions.results], ["committed", "rolled back", "committed"])
+
+	def test_failed_batch_after_pending_batch(self):
+		"""A good batch that is still pending when the next one fails is kept, and committed by finish()"""
+		commits = []
+		transactions = TransactionManager(self.db, every_rows=10, savepoints=True, on_commit=lambda: commits.append(len(transactions.results)))
+		with transactions.batch(1):
+			self.db.execute("INSERT INTO t(id) VALUES (1)")
+		transactions.every_seconds = 0
+		with transactions.batch(1):
+			self.db.execute("INSERT INTO t(id) VALUES (2)")
+			raise ValueError("bad row")
+		self.assertEqual(commits, [])
+		transactions.finish()
+		self.assertEqual(commits, [2])
+		self.assertEqual([row[0] for row in self.db.execute("SELECT id FROM t")], [1])
+
+
+if __name__ == "__main__":
+	unittest.main()